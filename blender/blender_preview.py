@@ -0,0 +1,129 @@
+# Reads the preview image that Blender stores in every saved .blend file
+# (the "TEST" block right after the file header) without starting Blender
+import gzip
+import struct
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _open_blend(path):
+    with open(path, "rb") as file:
+        magic = file.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, "rb")
+    if magic == ZSTD_MAGIC:
+        # Blender 3.0 and newer compress with zstd, which needs an extra module
+        try:
+            import zstandard
+        except ImportError:
+            return None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    return open(path, "rb")
+
+
+def _read_header(file):
+    header = file.read(12)
+    if not header.startswith(b"BLENDER"):
+        return None
+
+    if header[7:9] == b"17":
+        # Blender 5.0 and newer: BLENDER17-01v0500
+        header += file.read(5)
+        endian = "<" if header[12:13] == b"v" else ">"
+        return endian, "large"
+
+    pointer_size = 8 if header[7:8] == b"-" else 4
+    endian = "<" if header[8:9] == b"v" else ">"
+    return endian, pointer_size
+
+
+def _read_block_headers(file, endian, pointer_size):
+    if pointer_size == "large":
+        # code, SDNAnr, old pointer, length, count
+        block_format = struct.Struct(endian + "4siQqq")
+    else:
+        pointer = "Q" if pointer_size == 8 else "I"
+        # code, length, old pointer, SDNAnr, count
+        block_format = struct.Struct(endian + "4si" + pointer + "ii")
+
+    while True:
+        data = file.read(block_format.size)
+        if len(data) < block_format.size:
+            return
+
+        values = block_format.unpack(data)
+        code = values[0]
+        length = values[3] if pointer_size == "large" else values[1]
+        yield code, length
+
+
+def read_embedded_preview(path):
+    # Returns (width, height, rgba) with the rows ordered top to bottom,
+    # or None if the file has no preview
+    file = _open_blend(path)
+    if file is None:
+        return None
+
+    with file:
+        header = _read_header(file)
+        if header is None:
+            return None
+        endian, pointer_size = header
+
+        for code, length in _read_block_headers(file, endian, pointer_size):
+            if code == b"TEST":
+                width, height = struct.unpack(endian + "ii", file.read(8))
+                if width <= 0 or height <= 0:
+                    return None
+                pixels = file.read(width * height * 4)
+                if len(pixels) != width * height * 4:
+                    return None
+
+                # Blender stores the image bottom to top
+                row = width * 4
+                rows = [pixels[i : i + row] for i in range(0, len(pixels), row)]
+                return width, height, b"".join(reversed(rows))
+
+            # The preview is written before any scene data
+            if code != b"REND":
+                return None
+            file.read(length)
+
+    return None
+
+
+def write_png(path, width, height, rgba):
+    def chunk(chunk_type, data):
+        return (
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+        )
+
+    row = width * 4
+    raw = b"".join(b"\x00" + rgba[i : i + row] for i in range(0, len(rgba), row))
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        )
+        file.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def extract_embedded_preview(path, output):
+    try:
+        preview = read_embedded_preview(path)
+    except (OSError, EOFError, struct.error):
+        return False
+
+    if preview is None:
+        return False
+
+    width, height, rgba = preview
+    write_png(output, width, height, rgba)
+    return True
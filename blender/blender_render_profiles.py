@@ -0,0 +1,42 @@
+import json
+
+# Render profiles for the thumbnail action. Resolution and samples that are
+# set to None are taken from blender_eevee_settings.py
+PROFILES = {
+    "EEVEE": {
+        "engine": "BLENDER_EEVEE",
+        "resolution": None,
+        "samples": None,
+        "embedded": False,
+    },
+    "EEVEE (low resolution)": {
+        "engine": "BLENDER_EEVEE",
+        "resolution": [640, 360],
+        "samples": 1,
+        "embedded": False,
+    },
+    "Solid Preview": {
+        "engine": "BLENDER_WORKBENCH",
+        "resolution": [1280, 720],
+        "samples": None,
+        "embedded": False,
+    },
+    # Reads the preview that Blender saves into the .blend file and only
+    # renders a solid preview for files without one
+    "Embedded Preview": {
+        "engine": "BLENDER_WORKBENCH",
+        "resolution": [1280, 720],
+        "samples": None,
+        "embedded": True,
+    },
+}
+DEFAULT_PROFILE = "EEVEE"
+
+
+def get_profile(name):
+    return PROFILES.get(name, PROFILES[DEFAULT_PROFILE])
+
+
+def to_argument(profile):
+    # Passed to blender_thumbnail_driver.py on the command line
+    return json.dumps(profile)
@@ -1,80 +1,327 @@
 import anchorpoint as ap
 import apsync as aps
 import subprocess
+import threading
+import platform
 import random
 import string
 import os
 
+import blender_preview
+import blender_render_profiles as render_profiles
+import blender_thumbnail_cache as thumbnail_cache
+
 ui = ap.UI()
 ctx = ap.get_context()
 
+# Printed by blender_thumbnail_driver.py after each file
+DONE_MARKER = "AP_THUMBNAIL_DONE"
+FAILED_MARKER = "AP_THUMBNAIL_FAILED"
+
+MAX_WORKERS = 4
+MEMORY_PER_WORKER = 2 * 1024 * 1024 * 1024
+
 
 def create_random_text():
     ran = "".join(random.choices(string.ascii_uppercase + string.digits, k=10))
     return str(ran)
 
 
-def render_blender(blender_path, selected_files, yaml_dir):
-    # Use a random output path within the Anchorpoint temporary directory
-    # so that we do not conflict with any other file
-    output = f"{ap.temp_dir()}/blender/{create_random_text()}"
+def get_total_memory():
+    try:
+        if platform.system() == "Windows":
+            import ctypes
 
-    # Show Progress
-    progress = ap.Progress(
-        "Blender Thumbnail",
-        "Rendering Images",
-        infinite=True,
-        cancelable=len(selected_files) > 1,
-    )
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys
+        if platform.system() == "Darwin":
+            return int(subprocess.check_output(["sysctl", "-n", "hw.memsize"]))
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except Exception:
+        return None
+
+
+def get_worker_count(file_count):
+    # Every Blender process renders on its own, but also holds a whole scene in memory
+    workers = max(1, (os.cpu_count() or 1) // 4)
+    memory = get_total_memory()
+    if memory:
+        workers = min(workers, max(1, memory // MEMORY_PER_WORKER))
+    return max(1, min(workers, MAX_WORKERS, file_count))
 
-    for file in selected_files:
-        if progress.canceled:
-            for file in ctx.selected_files:
-                ui.finish_busy(file)
-            return
 
-        subprocess.run(
+class BlenderServer:
+    # A background Blender that keeps running and renders one file after another
+    def __init__(self, blender_path, yaml_dir, profile, low_priority=False):
+        args = {}
+        if platform.system() == "Windows":
+            args["creationflags"] = subprocess.CREATE_NO_WINDOW
+            if low_priority:
+                args["creationflags"] |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        elif low_priority:
+            args["preexec_fn"] = lambda: os.nice(10)
+
+        self.process = subprocess.Popen(
             [
                 blender_path,
                 "-b",
-                file,
-                "-E",
-                "BLENDER_EEVEE",
-                "-F",
-                "PNG",
                 "-P",
+                f"{yaml_dir}/blender_thumbnail_driver.py",
+                "--",
                 f"{yaml_dir}/blender_eevee_settings.py",
-                "-o",
-                f"{output}#",
-                "-f",
-                "0",
-            ]
+                render_profiles.to_argument(profile),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            universal_newlines=True,
+            encoding="utf-8",
+            errors="replace",
+            **args,
         )
-        ui.replace_thumbnail(file, f"{output}0.png")
 
-    ui.show_success("Render Successful")
+    def render(self, file, output):
+        self.process.stdin.write(f"{file}\t{output}\n")
+        self.process.stdin.flush()
+
+        for line in self.process.stdout:
+            if line.startswith(DONE_MARKER):
+                return True
+            if line.startswith(FAILED_MARKER):
+                print(line.strip())
+                return False
+
+        # Blender has quit, e.g. because it crashed on this file
+        return False
 
+    def stop(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except Exception:
+            self.kill()
 
-# First, check if the tool can be found on the machine
-if "blender" in ctx.inputs:
-    blender_path = ctx.inputs["blender"]
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+
+
+def render_worker(blender_path, yaml_dir, profile, files, state):
+    server = None
+    try:
+        while not state["canceled"]:
+            with state["lock"]:
+                if not files:
+                    return
+                file, key = files.pop(0)
+
+            if server is None:
+                server = BlenderServer(
+                    blender_path, yaml_dir, profile, state["background"]
+                )
+                state["servers"].append(server)
+
+            if key:
+                output = thumbnail_cache.get_temp_output(key)
+            else:
+                # Use a random output path within the Anchorpoint temporary directory
+                # so that we do not conflict with any other file
+                output = f"{ap.temp_dir()}/blender/{create_random_text()}"
+            success = server.render(file, output) and not state["canceled"]
+
+            thumbnail = f"{output}0.png"
+            if key:
+                if success:
+                    thumbnail = thumbnail_cache.store_output(output, key)
+                    success = thumbnail is not None
+                else:
+                    thumbnail_cache.discard_output(output)
+
+            if success:
+                ui.replace_thumbnail(file, thumbnail)
+            elif server.process.poll() is not None:
+                server = None
+
+            with state["lock"]:
+                state["done"] += 1
+                if not success:
+                    state["failed"].append(file)
+            if not state["background"]:
+                ui.finish_busy(file)
+    finally:
+        if server:
+            server.stop()
+
+
+def render_blender(
+    blender_path,
+    selected_files,
+    yaml_dir,
+    profile_name=render_profiles.DEFAULT_PROFILE,
+    background=False,
+):
+    # In background mode (used by the thumbnail watcher) a single low priority
+    # Blender renders the files without any progress or notifications
+    profile = render_profiles.get_profile(profile_name)
+
+    # Show Progress
+    progress = None
+    if not background:
+        progress = ap.Progress(
+            "Blender Thumbnail",
+            "Rendering Images",
+            infinite=len(selected_files) == 1,
+            cancelable=len(selected_files) > 1,
+        )
 
+    state = {
+        "lock": threading.Lock(),
+        "canceled": False,
+        "done": 0,
+        "failed": [],
+        "servers": [],
+        "background": background,
+    }
+
+    # Files that did not change since the last render reuse their thumbnail
+    settings_hash = thumbnail_cache.hash_settings(
+        f"{yaml_dir}/blender_eevee_settings.py",
+        f"{yaml_dir}/blender_thumbnail_driver.py",
+        extra=render_profiles.to_argument(profile),
+    )
+    files = []
+    for file in selected_files:
+        try:
+            key = thumbnail_cache.get_key(file, settings_hash)
+        except OSError:
+            key = None
+
+        thumbnail = thumbnail_cache.get_thumbnail(key) if key else None
+        if not thumbnail and key and profile["embedded"]:
+            # Reading the preview from the file takes milliseconds, no Blender needed
+            output = thumbnail_cache.get_temp_output(key)
+            if blender_preview.extract_embedded_preview(file, f"{output}0.png"):
+                thumbnail = thumbnail_cache.store_output(output, key)
+            else:
+                thumbnail_cache.discard_output(output)
+
+        if thumbnail:
+            ui.replace_thumbnail(file, thumbnail)
+            if not background:
+                ui.finish_busy(file)
+            state["done"] += 1
+        else:
+            files.append((file, key))
+
+    workers = [
+        threading.Thread(
+            target=render_worker,
+            args=(blender_path, yaml_dir, profile, files, state),
+            daemon=True,
+        )
+        for _ in range(1 if background else get_worker_count(len(files)))
+    ]
+    for worker in workers:
+        worker.start()
+
+    while any(worker.is_alive() for worker in workers):
+        if progress and progress.canceled and not state["canceled"]:
+            state["canceled"] = True
+            for server in state["servers"]:
+                server.kill()
+
+        if progress and len(selected_files) > 1:
+            progress.report_progress(state["done"] / len(selected_files))
+            progress.set_text(f"Rendered {state['done']} of {len(selected_files)}")
+
+        for worker in workers:
+            worker.join(timeout=0.2)
+
+    if progress:
+        progress.finish()
+    thumbnail_cache.trim()
+
+    if background:
+        if state["failed"]:
+            print(f"Could not render thumbnails for {', '.join(state['failed'])}")
+        return
+
+    if state["canceled"]:
+        # Files that were still waiting in the queue
+        for file, _ in files:
+            ui.finish_busy(file)
+        return
+    if state["failed"]:
+        ui.show_error(
+            "Render Failed",
+            f"Could not render {len(state['failed'])} of {len(selected_files)} files",
+        )
+    else:
+        ui.show_success("Render Successful")
+
+
+def get_blender_executable(blender_path):
     if blender_path.lower().endswith("blender.app"):
         blender_path = os.path.join(blender_path, "Contents/MacOS/Blender")
+    return blender_path
 
-    if ap.check_application(
-        blender_path, "Path to Blender is not correct, please try again", "blender"
-    ):
-        # Tell the UI that these files are being processed
-        for file in ctx.selected_files:
-            ui.show_busy(file)
 
-        # Render the thumbnail
-        # We don't want to block the Anchorpoint UI, hence we run on a background thread
-        ctx.run_async(render_blender, blender_path, ctx.selected_files, ctx.yaml_dir)
-    else:
-        # Remove the path to blender from the action settings so that the user must provide it again
-        settings = aps.Settings()
-        if settings:
-            settings.remove("blender")
-            settings.store()
+def main():
+    # First, check if the tool can be found on the machine
+    if "blender" in ctx.inputs:
+        blender_path = get_blender_executable(ctx.inputs["blender"])
+
+        if ap.check_application(
+            blender_path, "Path to Blender is not correct, please try again", "blender"
+        ):
+            # The thumbnail watcher runs as another action and reads the path from here
+            shared_settings = aps.Settings("blender_thumbnail")
+            if shared_settings.get("blender_path") != blender_path:
+                shared_settings.set("blender_path", blender_path)
+                shared_settings.store()
+
+            # Tell the UI that these files are being processed
+            for file in ctx.selected_files:
+                ui.show_busy(file)
+
+            # Render the thumbnail
+            # We don't want to block the Anchorpoint UI, hence we run on a background thread
+            profile_name = aps.Settings("blender_thumbnail").get(
+                "profile", render_profiles.DEFAULT_PROFILE
+            )
+            ctx.run_async(
+                render_blender,
+                blender_path,
+                ctx.selected_files,
+                ctx.yaml_dir,
+                profile_name,
+            )
+        else:
+            # Remove the path to blender from the action settings so that the user must provide it again
+            settings = aps.Settings()
+            if settings:
+                settings.remove("blender")
+                settings.store()
+            shared_settings = aps.Settings("blender_thumbnail")
+            shared_settings.remove("blender_path")
+            shared_settings.store()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+import uuid
+
+thumbnail_cache_path = "~/Documents/Anchorpoint/actions/blender/thumbnails"
+
+# Least recently used thumbnails are evicted above this size
+MAX_CACHE_SIZE = 512 * 1024 * 1024
+
+# Temporary renders are written by running workers, only the ones older than
+# this have been left behind by a crash
+MAX_TEMP_AGE = 24 * 60 * 60
+
+
+def get_cache_dir():
+    cache_dir = os.path.normpath(os.path.expanduser(thumbnail_cache_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def hash_settings(*settings_files, extra=""):
+    # Thumbnails have to be rendered again when the render settings change
+    settings_hash = hashlib.sha1(extra.encode("utf-8"))
+    for settings_file in settings_files:
+        try:
+            with open(settings_file, "rb") as file:
+                settings_hash.update(file.read())
+        except OSError:
+            pass
+    return settings_hash.hexdigest()
+
+
+def get_key(blend_file, settings_hash):
+    stat = os.stat(blend_file)
+    key = hashlib.sha1(
+        f"{os.path.normcase(os.path.abspath(blend_file))}|{stat.st_size}|{stat.st_mtime_ns}|{settings_hash}".encode(
+            "utf-8"
+        )
+    )
+    return key.hexdigest()
+
+
+def get_output(key):
+    # Blender writes the image to <output>0.png, see blender_thumbnail_driver.py
+    return os.path.join(get_cache_dir(), key)
+
+
+def get_temp_output(key):
+    # Blender renders to a temporary name first, an interrupted render must
+    # never end up as the cached thumbnail
+    return os.path.join(get_cache_dir(), f".{key}-{uuid.uuid4().hex}-")
+
+
+def discard_output(temp_output):
+    try:
+        os.remove(f"{temp_output}0.png")
+    except OSError:
+        pass
+
+
+def store_output(temp_output, key):
+    # Moves a finished render into the cache, returns the thumbnail or None
+    temp_thumbnail = f"{temp_output}0.png"
+    try:
+        if os.path.getsize(temp_thumbnail) > 0:
+            thumbnail = f"{get_output(key)}0.png"
+            os.replace(temp_thumbnail, thumbnail)
+            return thumbnail
+    except OSError:
+        pass
+    discard_output(temp_output)
+    return None
+
+
+def get_thumbnail(key):
+    thumbnail = f"{get_output(key)}0.png"
+    if not os.path.isfile(thumbnail):
+        return None
+
+    # Mark the thumbnail as recently used
+    os.utime(thumbnail)
+    return thumbnail
+
+
+def trim(max_size=MAX_CACHE_SIZE):
+    thumbnails = []
+    total_size = 0
+    now = time.time()
+    for entry in os.scandir(get_cache_dir()):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        if entry.name.startswith("."):
+            if now - stat.st_mtime > MAX_TEMP_AGE:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            continue
+        thumbnails.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size += stat.st_size
+
+    for _, size, path in sorted(thumbnails):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
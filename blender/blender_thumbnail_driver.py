@@ -0,0 +1,56 @@
+# This script runs inside a background Blender process. It keeps Blender alive
+# and renders a thumbnail for every "<blend file>\t<output>" line it reads from
+# stdin, so that the Blender startup cost is only paid once per process.
+# Like "-o <output># -f 0" on the command line, the image is written to
+# <output>0.png
+import bpy
+import json
+import runpy
+import sys
+
+DONE_MARKER = "AP_THUMBNAIL_DONE"
+FAILED_MARKER = "AP_THUMBNAIL_FAILED"
+
+arguments = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+settings_script = arguments[0] if arguments else None
+profile = json.loads(arguments[1]) if len(arguments) > 1 else {}
+
+
+def render(blend_file, output):
+    bpy.ops.wm.open_mainfile(filepath=blend_file)
+    scene = bpy.context.scene
+
+    engine = profile.get("engine") or "BLENDER_EEVEE"
+    try:
+        scene.render.engine = engine
+    except TypeError:
+        # Blender 4.2 and newer
+        scene.render.engine = "BLENDER_EEVEE_NEXT"
+    scene.render.image_settings.file_format = "PNG"
+
+    if settings_script:
+        runpy.run_path(settings_script)
+
+    if profile.get("resolution"):
+        scene.render.resolution_x, scene.render.resolution_y = profile["resolution"]
+    if profile.get("samples"):
+        scene.eevee.taa_render_samples = profile["samples"]
+    if engine == "BLENDER_WORKBENCH":
+        scene.display.shading.color_type = "MATERIAL"
+
+    scene.frame_set(0)
+    scene.render.filepath = f"{output}#"
+    bpy.ops.render.render(write_still=True)
+
+
+for line in sys.stdin:
+    line = line.rstrip("\n")
+    if not line:
+        continue
+
+    blend_file, output = line.split("\t")
+    try:
+        render(blend_file, output)
+        print(f"{DONE_MARKER}\t{blend_file}", flush=True)
+    except Exception as e:
+        print(f"{FAILED_MARKER}\t{blend_file}\t{e}", flush=True)
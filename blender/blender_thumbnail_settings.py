@@ -0,0 +1,50 @@
+import anchorpoint as ap
+import apsync as aps
+
+import blender_render_profiles as render_profiles
+
+ctx = ap.get_context()
+settings = aps.Settings("blender_thumbnail")
+
+profile_var = "profile"
+
+
+def button_clicked(dialog):
+    settings.set("profile", dialog.get_value(profile_var))
+    settings.store()
+    dialog.close()
+
+
+def open_dialog():
+    profile = settings.get("profile", render_profiles.DEFAULT_PROFILE)
+    if profile not in render_profiles.PROFILES:
+        profile = render_profiles.DEFAULT_PROFILE
+
+    dialog = ap.Dialog()
+    dialog.title = "Thumbnail Settings"
+    dialog.add_text("Render Profile", width=88).add_dropdown(
+        profile,
+        list(render_profiles.PROFILES.keys()),
+        var=profile_var,
+        width=320,
+    )
+    dialog.add_info(
+        "<b>EEVEE</b> renders with the settings of blender_eevee_settings.py<br>"
+        "<b>Solid Preview</b> uses the fast Workbench engine<br>"
+        "<b>Embedded Preview</b> reads the preview that Blender stores when saving,<br>"
+        "and only renders a solid preview for files without one"
+    )
+    dialog.add_button("Apply", callback=button_clicked)
+
+    if ctx.icon:
+        dialog.icon = ctx.icon
+
+    dialog.show()
+
+
+def main():
+    open_dialog()
+
+
+if __name__ == "__main__":
+    main()
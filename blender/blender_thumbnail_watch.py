@@ -0,0 +1,81 @@
+import anchorpoint as ap
+import apsync as aps
+import os
+
+# Imported modules stay loaded between action runs, so the running
+# watchers are shared by all runs of this action
+import blender_thumbnail_watcher
+import blender_render_profiles as render_profiles
+
+
+def get_blender_path():
+    # Stored by the "Render Thumbnail" action, the settings of an action
+    # without a name cannot be read by other actions
+    blender_path = aps.Settings("blender_thumbnail").get("blender_path")
+    if not blender_path:
+        return None
+    return blender_path
+
+
+def get_watched_folders(settings):
+    return list(settings.get("watched_folders", []))
+
+
+def start(folder, yaml_dir):
+    blender_path = get_blender_path()
+    if blender_path is None or not os.path.exists(blender_path):
+        return False
+
+    settings = aps.Settings("blender_thumbnail")
+    blender_thumbnail_watcher.start_watching(
+        folder,
+        blender_path,
+        yaml_dir,
+        settings.get("profile", render_profiles.DEFAULT_PROFILE),
+    )
+    return True
+
+
+def toggle_watching(ctx: ap.Context):
+    ui = ap.UI()
+    folder = ctx.project_path if ctx.project_path else ctx.path
+    settings = aps.Settings("blender_thumbnail")
+    watched_folders = get_watched_folders(settings)
+
+    if blender_thumbnail_watcher.is_watching(folder) or folder in watched_folders:
+        blender_thumbnail_watcher.stop_watching(folder)
+        if folder in watched_folders:
+            watched_folders.remove(folder)
+        settings.set("watched_folders", watched_folders)
+        settings.store()
+        ui.show_info("Thumbnail refresh stopped", os.path.basename(folder))
+        return
+
+    if not start(folder, ctx.yaml_dir):
+        ui.show_error(
+            "Blender not found",
+            "Render a thumbnail once with Blender / Render Thumbnail to set the path to Blender",
+        )
+        return
+
+    watched_folders.append(folder)
+    settings.set("watched_folders", watched_folders)
+    settings.store()
+    ui.show_success(
+        "Thumbnail refresh started",
+        "Saved .blend files in this project get a new thumbnail automatically",
+    )
+
+
+def on_application_started(ctx: ap.Context):
+    try:
+        settings = aps.Settings("blender_thumbnail")
+        for folder in get_watched_folders(settings):
+            if os.path.isdir(folder):
+                start(folder, ctx.yaml_dir)
+    except Exception as e:
+        print(f"Could not start the thumbnail watcher: {e}")
+
+
+if __name__ == "__main__":
+    toggle_watching(ap.get_context())
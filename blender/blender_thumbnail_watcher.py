@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import blender_render_profiles as render_profiles
+
+# How often the folders that contain .blend files are checked for saves
+POLL_INTERVAL = 10
+
+# How often the whole project is scanned for new folders with .blend files.
+# Large projects and Cloud Drive folders are expensive to walk, so slow scans
+# make the next one wait longer
+FULL_SCAN_INTERVAL = 10 * 60
+MAX_FULL_SCAN_INTERVAL = 60 * 60
+
+# A file is only rendered once it has not been saved again for this long
+DEBOUNCE_SECONDS = 20
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+class ThumbnailWatcher(threading.Thread):
+    def __init__(self, root, blender_path, yaml_dir, profile_name):
+        super().__init__(daemon=True)
+        self.root = root
+        self.blender_path = blender_path
+        self.yaml_dir = yaml_dir
+        self.profile_name = profile_name
+        self._stop_event = threading.Event()
+        self.next_full_scan = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _scan(self, folders, recursive):
+        blend_files = {}
+        folders = list(folders)
+        while folders:
+            try:
+                entries = list(os.scandir(folders.pop()))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            folders.append(entry.path)
+                    elif entry.name.lower().endswith(".blend"):
+                        blend_files[entry.path] = entry.stat().st_mtime_ns
+                except OSError:
+                    pass
+        return blend_files
+
+    def _full_scan(self):
+        start = time.monotonic()
+        blend_files = self._scan([self.root], recursive=True)
+        duration = time.monotonic() - start
+        interval = min(max(FULL_SCAN_INTERVAL, duration * 100), MAX_FULL_SCAN_INTERVAL)
+        self.next_full_scan = time.monotonic() + interval
+        return blend_files
+
+    def run(self):
+        # Imported here, so that the action script is not executed on import
+        import blender_thumbnail
+
+        known = self._full_scan()
+        pending = {}
+        while not self._stop_event.wait(POLL_INTERVAL):
+            # In between full scans only the folders with .blend files are listed
+            if time.monotonic() >= self.next_full_scan:
+                current = self._full_scan()
+            else:
+                folders = {os.path.dirname(path) for path in known}
+                current = self._scan(folders, recursive=False)
+            now = time.monotonic()
+            for path, mtime in current.items():
+                if known.get(path) != mtime:
+                    # Every new save restarts the debounce time of the file
+                    pending[path] = now
+            known = current
+
+            ready = [
+                path
+                for path, changed in pending.items()
+                if now - changed >= DEBOUNCE_SECONDS and path in current
+            ]
+            for path in list(pending.keys()):
+                if path in ready or path not in current:
+                    del pending[path]
+
+            if ready:
+                try:
+                    blender_thumbnail.render_blender(
+                        self.blender_path,
+                        ready,
+                        self.yaml_dir,
+                        self.profile_name,
+                        background=True,
+                    )
+                except Exception as e:
+                    print(f"Thumbnail watcher for {self.root} failed: {e}")
+
+
+def is_watching(root):
+    with _watchers_lock:
+        watcher = _watchers.get(os.path.normcase(root))
+        return watcher is not None and watcher.is_alive()
+
+
+def start_watching(
+    root, blender_path, yaml_dir, profile_name=render_profiles.DEFAULT_PROFILE
+):
+    with _watchers_lock:
+        key = os.path.normcase(root)
+        watcher = _watchers.get(key)
+        if watcher and watcher.is_alive():
+            return
+        watcher = ThumbnailWatcher(root, blender_path, yaml_dir, profile_name)
+        _watchers[key] = watcher
+        watcher.start()
+
+
+def stop_watching(root):
+    with _watchers_lock:
+        watcher = _watchers.pop(os.path.normcase(root), None)
+    if watcher:
+        watcher.stop()
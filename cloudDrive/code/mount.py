@@ -6,6 +6,8 @@ import os
 import sys
 import json
 import socket
+import threading
+from urllib.parse import urlparse
 
 # current fix to make sure that no old module is loaded
 if "rclone_install_helper" in sys.modules:
@@ -16,31 +18,40 @@ if "rclone_config_helper" in sys.modules:
     del sys.modules["rclone_config_helper"]
 import rclone_config_helper as rclone_config
 
-path_var = "path"
-mac_mount_name = "anchorpoint"
+if "rclone_log_helper" in sys.modules:
+    del sys.modules["rclone_log_helper"]
+import rclone_log_helper as rclone_log
 
+if "rclone_profile_helper" in sys.modules:
+    del sys.modules["rclone_profile_helper"]
+import rclone_profile_helper as rclone_profile
 
-def generate_secret_key(password: str, salt: bytes) -> str:
-    from Crypto.Protocol.KDF import PBKDF2
+if "rclone_cache_helper" in sys.modules:
+    del sys.modules["rclone_cache_helper"]
+import rclone_cache_helper as rclone_cache
 
-    return PBKDF2(password, salt, dkLen=32)
+if "rclone_prewarm_helper" in sys.modules:
+    del sys.modules["rclone_prewarm_helper"]
+import rclone_prewarm_helper as rclone_prewarm
 
+# Not reloaded, the derived keys are cached for the whole session
+import rclone_crypto_helper as rclone_crypto
 
-def decrypt(encrypted: str, password: str) -> str:
-    from Crypto.Cipher import AES
-    from Crypto.Util.Padding import unpad
+# Not reloaded, there is only one supervisor per workspace
+import rclone_supervisor_helper as rclone_supervisor
 
-    bytes_encrypted = bytes.fromhex(encrypted)
-    iv = bytes_encrypted[:16]
-    ciphered_data = bytes_encrypted[16:-32]
+# Not reloaded, the connections to the running mounts are kept in memory
+import rclone_rc_helper as rclone_rc
+
+path_var = "path"
+mac_mount_name = "anchorpoint"
 
-    salt = bytes_encrypted[-32:]
-    secret_key = generate_secret_key(password, salt)
+# Network checks must never hold up Anchorpoint, they give up after a few seconds
+CONNECTION_TIMEOUT = 3
 
-    cipher = AES.new(secret_key, AES.MODE_CBC, iv=iv)
-    original_data = unpad(cipher.decrypt(ciphered_data), AES.block_size)
 
-    return original_data.decode()
+def decrypt(encrypted: str, password: str) -> str:
+    return rclone_crypto.decrypt(encrypted, password)
 
 
 def get_unused_drives():
@@ -67,15 +78,48 @@ def create_bat_file(command, drive):
 
 
 def check_internet_connection():
+    return check_reachable("www.google.com", 80)
+
+
+def check_reachable(host, port=443, timeout=CONNECTION_TIMEOUT):
     try:
-        socket.create_connection(("www.google.com", 80))
+        socket.create_connection((host, port), timeout=timeout).close()
         return True
     except OSError:
         pass
     return False
 
 
-def setup_mount(drive, workspace_id, configuration):
+def get_endpoint(configuration):
+    # The host that rclone talks to, used to check the connection before mounting
+    config_type = configuration["type"]
+    if config_type == "b2":
+        return "api.backblazeb2.com", 443
+    if config_type == "s3aws":
+        region = configuration["s3aws_region"]
+        return (f"s3.{region}.amazonaws.com" if region else "s3.amazonaws.com"), 443
+    if config_type == "s3wasabi":
+        return f"s3.{configuration['s3wasabi_region']}.wasabisys.com", 443
+    if config_type == "azureblob":
+        url = urlparse(configuration["azureblob_sas_url"])
+        return url.hostname, url.port or 443
+    if config_type == "gcs":
+        return "storage.googleapis.com", 443
+    if config_type == "s3other":
+        endpoint = configuration["s3other_endpoint"]
+        url = urlparse(endpoint if "://" in endpoint else f"https://{endpoint}")
+        return url.hostname, url.port or (80 if url.scheme == "http" else 443)
+    return "www.google.com", 80
+
+
+def check_endpoint_reachable(configuration):
+    host, port = get_endpoint(configuration)
+    if not host:
+        return check_internet_connection()
+    return check_reachable(host, port)
+
+
+def setup_mount(drive, workspace_id, configuration, supervised=False):
     def create_config_arguments():
         config = []
 
@@ -210,28 +254,29 @@ def setup_mount(drive, workspace_id, configuration):
         "full",
         "--vfs-cache-max-age",
         "10000h",
-        "--vfs-read-chunk-size",
-        "512M",
+        *rclone_cache.get_arguments(cache_path, local_settings),
         "--vfs-fast-fingerprint",
-        "--transfers",
-        "10",
         "--network-mode",
         "--use-server-modtime",
         "--fast-list",
         "--cache-dir",
         cache_path,
-        "--dir-cache-time",
-        "5s",
         "--volname=Anchorpoint",
         "--file-perms=0777",
         "--dir-perms=0777",
         "--use-json-log",
-        "--stats",
-        "1s",
         "--log-level",
         "INFO",
     ]
 
+    rclone_arguments += rclone_profile.get_arguments(
+        local_settings.get("profile", rclone_profile.DEFAULT_PROFILE)
+    )
+
+    # Transfers and the cache are read through the remote control
+    connection = rclone_rc.create_connection()
+    rclone_arguments += rclone_rc.get_arguments(connection)
+
     arguments = base_arguments + config_arguments + rclone_arguments
 
     ctx = ap.get_context()
@@ -240,11 +285,21 @@ def setup_mount(drive, workspace_id, configuration):
         startupinfo.dwFlags = (
             subprocess.CREATE_NEW_CONSOLE | subprocess.STARTF_USESHOWWINDOW
         )
-        ctx.run_async(run_rclone, arguments, drive, workspace_id, startupinfo)
+        ctx.run_async(
+            run_rclone,
+            arguments,
+            drive,
+            workspace_id,
+            connection,
+            startupinfo,
+            supervised,
+        )
     else:
         # add daemon for mac
         arguments.append("--daemon")
-        ctx.run_async(run_rclone, arguments, drive, workspace_id)
+        ctx.run_async(
+            run_rclone, arguments, drive, workspace_id, connection, None, supervised
+        )
 
 
 def setup_rclone_config(
@@ -293,19 +348,91 @@ def store_auto_mount(success: bool, drive: str, workspace_id: str):
     local_settings.store()
 
 
-def run_rclone(arguments, drive, workspace_id, startupinfo=None):
+def start_upload_poller(connection, workspace_id):
+    metrics = rclone_log.UploadMetrics()
+    upload_progress = rclone_log.UploadProgress(metrics)
+
+    def on_update(stats, vfs_stats):
+        metrics.on_update(stats, vfs_stats)
+        upload_progress.update()
+
+    rclone_rc.store_connection(connection, workspace_id)
+    poller = rclone_rc.RcPoller(connection, on_update)
+    poller.start()
+    return poller, upload_progress
+
+
+def warm_pinned_folders(connection, workspace_id):
+    pinned = [
+        path for path in rclone_prewarm.get_pinned(workspace_id) if os.path.exists(path)
+    ]
+    if not pinned:
+        return
+
+    progress = ap.Progress(
+        "Cloud Drive", "Loading folders into the cache", cancelable=True
+    )
+    report = rclone_prewarm.warm(pinned, connection, progress)
+    progress.finish()
+    print(
+        f"Cloud Drive: {report['files']} pinned files loaded, {report['failed']} failed"
+    )
+
+
+def start_warming_pinned_folders(connection, workspace_id):
+    threading.Thread(
+        target=warm_pinned_folders, args=(connection, workspace_id), daemon=True
+    ).start()
+
+
+def remount(drive, workspace_id):
+    # Called by the supervisor when the mount has crashed or does not respond
+    password = aps.Settings("rclone").get("encryption_password")
+    if not password:
+        return
+    auto_mount(drive, workspace_id, password, supervised=True)
+
+
+def start_supervisor(drive, workspace_id, connection, process=None):
+    rclone_supervisor.supervise(workspace_id, drive, connection, process, remount)
+
+
+def run_rclone(
+    arguments, drive, workspace_id, connection, startupinfo=None, supervised=False
+):
+    # A supervised run mounts the drive again after a crash. It shows nothing
+    # and keeps the auto mount setting when it fails, the supervisor tries again
     ui = ap.UI()
-    rclone_success = "The service rclone has been started"
-    rlcone_wrong_credentials = "SignatureDoesNotMatch"
-    rlcone_wrong_access_key = "InvalidAccessKeyId"
-    count_msg = "queuing for upload"
-    upload_succeeded_msg = "upload succeeded"
-    progress = None
-    global_progress = ap.Progress("Mounting Cloud Drive", show_loading_screen=True)
+    global_progress = None
+    if not supervised:
+        global_progress = ap.Progress("Mounting Cloud Drive", show_loading_screen=True)
+    poller = None
+
+    def mount_failed(title, description=None, duration=None):
+        if supervised:
+            print(f"Cloud Drive could not be mounted again: {title}")
+            return
+        arguments = {"title": title}
+        if description:
+            arguments["description"] = description
+        if duration:
+            arguments["duration"] = duration
+        ui.show_error(**arguments)
+        store_auto_mount(False, drive, workspace_id)
+
+    def mount_succeeded():
+        # The drive might have been unmounted while it was mounted again
+        if supervised and not rclone_supervisor.should_restart(workspace_id):
+            return False
+        store_auto_mount(True, drive, workspace_id)
+        if not supervised:
+            ui.show_success("Mount Successful")
+        return True
 
     p = subprocess.Popen(
         args=arguments,
         startupinfo=startupinfo,
+        env=rclone_rc.get_environment(connection),
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         stdin=subprocess.PIPE,
@@ -313,113 +440,68 @@ def run_rclone(arguments, drive, workspace_id, startupinfo=None):
         universal_newlines=True,
     )
 
-    count = 0
-    count_uploaded = 0
-
     for line in p.stdout:
-        myjson = is_json(line)
-
-        if count_msg in line:
-            count = add_to_count(count, 1)
+        event = rclone_log.parse_line(line)
+        kind = event.kind
 
-        if upload_succeeded_msg in line:
-            count_uploaded = add_to_count(count_uploaded, 1)
+        if kind is None:
+            continue
 
-        if (
-            myjson is not None
-            and myjson["level"] == "error"
-            and myjson["msg"] == "Mount failed"
-        ):
-            ui.show_error("Something went wrong")
-            store_auto_mount(False, drive, workspace_id)
+        if kind == rclone_log.MOUNT_FAILED and event.level == "error":
+            mount_failed("Something went wrong")
             return
-        elif rclone_success in line:
+        elif kind == rclone_log.MOUNTED:
+            if not mount_succeeded():
+                p.kill()
+                return
             ui.reload_drives()
-            store_auto_mount(True, drive, workspace_id)
-            ui.show_success("Mount Successful")
-            global_progress.finish()
-            global_progress = None
+            if global_progress:
+                global_progress.finish()
+                global_progress = None
             ui.reload()
-
-        elif rlcone_wrong_credentials in line:
-            ui.show_error(
+            poller, upload_progress = start_upload_poller(connection, workspace_id)
+            start_warming_pinned_folders(connection, workspace_id)
+            start_supervisor(drive, workspace_id, connection, p)
+        elif kind == rclone_log.CACHE_CLEANED:
+            cleanup = rclone_cache.record_cleanup(event.message)
+            if cleanup:
+                print(
+                    f"Cloud Drive cache: removed {cleanup['removed_files']} least recently used files, "
+                    f"freed {rclone_cache.format_size(cleanup['freed'])}"
+                )
+        elif kind == rclone_log.WRONG_CREDENTIALS:
+            mount_failed(
                 title="Invalid Settings",
                 duration=6000,
                 description='Your settings do not seem to be correct. Go to the settings of "Connect Cloud Drive" and check if you have made a typing error.',
             )
-            store_auto_mount(False, drive, workspace_id)
             return
-        elif rlcone_wrong_access_key in line:
-            ui.show_error(
+        elif kind == rclone_log.WRONG_ACCESS_KEY:
+            mount_failed(
                 title="Invalid Settings",
                 duration=6000,
                 description='Your Access Key seems to be wrong. Go to the settings of "Connect Cloud Drive" and check if you have made a typing error.',
             )
-            store_auto_mount(False, drive, workspace_id)
             return
 
-        if not global_progress and myjson and "Transferred" in myjson["msg"]:
-            progress = check_upload(myjson, progress, count, count_uploaded)
-
-        if progress is None:
-            count = set_count_to(count, 0)
-            count_uploaded = set_count_to(count_uploaded, 0)
+    if poller:
+        poller.stop()
+        upload_progress.finish()
 
     if not isWin():
         # Mac runs in daemon mode, so we assume everything has worked when we reach this point
+        if not mount_succeeded():
+            rclone_supervisor.unmount(drive, connection)
+            return
         if not isWin() and "reload_drives" in dir(ui):
             ui.reload_drives()
-        ui.show_success("Mount Successful")
-        store_auto_mount(True, drive, workspace_id)
+        if global_progress:
+            global_progress.finish()
         ui.reload()
-
-
-def is_json(myjson):
-    try:
-        myjson = json.loads(myjson)
-    except ValueError:
-        return
-    return myjson
-
-
-def check_upload(myjson, progress, count, count_uploaded):
-    # get the percentage number without whitespaces
-    percentage = myjson["msg"].split(",")[1].strip()
-    upload_speed = myjson["msg"].split(",")[2].strip()
-
-    if not progress and percentage != "100%" and percentage != "-":
-        progress = ap.Progress(
-            "Syncing Files", percentage + " at " + upload_speed, infinite=False
-        )
-
-    if progress:
-        if count > 1:
-            progress.report_progress(count_uploaded / count)
-            progress.set_text(
-                str(int((count_uploaded / count) * 100)) + "%" + " at " + upload_speed
-            )
-        else:
-            if percentage == "-":
-                percentage = "0"
-            percentage_int = int(percentage.split("%")[0]) / 100
-            progress.report_progress(percentage_int)
-            progress.set_text(percentage + " at " + upload_speed)
-
-    if progress and percentage == "100%":
-        progress.finish()
-        progress = None
-
-    return progress
-
-
-def set_count_to(count, number):
-    count = number
-    return count
-
-
-def add_to_count(count, number):
-    count += number
-    return count
+        start_upload_poller(connection, workspace_id)
+        start_warming_pinned_folders(connection, workspace_id)
+        # The daemon is not a child process, the supervisor asks the remote control
+        start_supervisor(drive, workspace_id, connection)
 
 
 def get_default_cache_path():
@@ -584,9 +666,35 @@ def isWin():
     return False
 
 
+def auto_mount(drive: str, workspace_id: str, password: str, supervised=False):
+    # Runs in the background, decrypting and the connection check can take a while
+    shared_settings = aps.SharedSettings(workspace_id, "AnchorpointCloudMount")
+    configuration = rclone_config.get_config()
+    try:
+        if not resolve_configuration(shared_settings, configuration, password):
+            return
+        if not guarantee_rclone_config_setup(
+            drive, workspace_id, configuration, first_setup=False
+        ):
+            return
+    except:
+        return
+
+    if supervised and not rclone_supervisor.should_restart(workspace_id):
+        # Unmounted while the configuration was loaded
+        return
+    if check_endpoint_reachable(configuration):
+        setup_mount(drive, workspace_id, configuration, supervised)
+    elif not supervised:
+        ui = ap.UI()
+        ui.show_error(
+            "Cannot mount the Cloud Drive", "The cloud storage cannot be reached"
+        )
+
+
 def on_application_started(ctx: ap.Context):
+    # Only cheap checks happen here, everything else runs in the background
     try:
-        shared_settings = aps.SharedSettings(ctx.workspace_id, "AnchorpointCloudMount")
         mount_settings = aps.Settings(ctx.workspace_id)
         if not mount_settings.contains(
             "rclone-automount"
@@ -594,45 +702,34 @@ def on_application_started(ctx: ap.Context):
             return
 
         drive = mount_settings.get("rclone-drive")
-        auto_mount = mount_settings.get("rclone-automount")
-        if not auto_mount:
+        auto_mount_enabled = mount_settings.get("rclone-automount")
+        if not auto_mount_enabled:
             return
 
         if os.path.exists(drive):
             return
 
         local_settings = aps.Settings("rclone")
-        configuration = rclone_config.get_config()
         password = local_settings.get("encryption_password")
         if password is None:
             return
-        try:
-            resolve_configuration(shared_settings, configuration, password)
-            if not guarantee_rclone_config_setup(
-                drive, ctx.workspace_id, configuration, first_setup=False
-            ):
-                return
-        except:
-            return
-        if check_internet_connection():
-            ctx.run_async(setup_mount, drive, ctx.workspace_id, configuration)
-        else:
-            ui = ap.UI()
-            ui.show_error(
-                "Cannot mount the Cloud Drive", "You are not connected to the Internet"
-            )
+
+        ctx.run_async(auto_mount, drive, ctx.workspace_id, password)
     except:
         pass
 
 
-if __name__ == "__main__":
+def manual_mount(workspace_id):
+    # Runs in the background, the connection check can take a few seconds
     if check_internet_connection():
-        ctx = ap.get_context()
-        ctx.run_async(
-            rclone_install.check_winfsp_and_rclone, get_settings, ctx.workspace_id
-        )
+        rclone_install.check_winfsp_and_rclone(get_settings, workspace_id)
     else:
         ui = ap.UI()
         ui.show_error(
             "Cannot mount the Cloud Drive", "You are not connected to the Internet"
         )
+
+
+if __name__ == "__main__":
+    ctx = ap.get_context()
+    ctx.run_async(manual_mount, ctx.workspace_id)
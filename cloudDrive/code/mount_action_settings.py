@@ -2,10 +2,15 @@ import anchorpoint as ap
 import apsync as aps
 import os
 import sys
+import json
 import shutil
 import platform
 
 import rclone_install_helper as rclone_install
+import rclone_profile_helper as rclone_profile
+import rclone_cache_helper as rclone_cache
+import rclone_rc_helper as rclone_rc
+import rclone_supervisor_helper as rclone_supervisor
 
 ctx = ap.get_context()
 ui = ap.UI()
@@ -25,13 +30,158 @@ def isWin():
     return False
 
 
+benchmark_var = "benchmark_var"
+cache_usage_var = "cache_usage_var"
+
+
 def store_settings(dialog: ap.Dialog):
     cache_path = dialog.get_value("cache_var")
-    if cache_path != settings.get("cachepath"):
-        settings.set("cachepath", cache_path)
-        settings.store()
-        ui.show_success("Cache location changed")
-        dialog.close()
+    profile = dialog.get_value("profile_var")
+    max_size = dialog.get_value("cache_max_size_var")
+    min_free_space = dialog.get_value("cache_min_free_space_var")
+    try:
+        max_size = f"{max(float(max_size), rclone_cache.MIN_CACHE_SIZE):g}"
+        min_free_space = f"{max(float(min_free_space), 0):g}"
+    except ValueError:
+        ui.show_error("Invalid cache size", "Enter the sizes in GB")
+        return
+
+    if (
+        cache_path == settings.get("cachepath")
+        and profile == get_profile_name()
+        and (max_size, min_free_space) == get_cache_limits()
+    ):
+        return
+
+    settings.set("cachepath", cache_path)
+    settings.set("profile", profile)
+    settings.set("cache_max_size", max_size)
+    settings.set("cache_min_free_space", min_free_space)
+    settings.store()
+    ui.show_success("Settings changed", "Mount the drive again to apply them")
+    dialog.close()
+
+
+def get_profile_name():
+    profile = settings.get("profile")
+    if profile not in rclone_profile.PROFILES:
+        profile = rclone_profile.DEFAULT_PROFILE
+    return profile
+
+
+def get_cache_limits():
+    max_size, min_free_space = rclone_cache.get_limits(settings)
+    return f"{max_size:g}", f"{min_free_space:g}"
+
+
+def get_cache_usage_text(cache_path, usage):
+    max_size, _ = rclone_cache.get_limits(settings)
+
+    if usage["bytes_used"] is None:
+        text = f"Counting the cache size, the limit is {max_size:g} GB"
+    else:
+        text = f"Cache uses <b>{rclone_cache.format_size(usage['bytes_used'])}</b> of {max_size:g} GB"
+    if usage["files"] is not None:
+        text += f" in {usage['files']} files"
+    if usage["free"] is not None:
+        text += f", {rclone_cache.format_size(usage['free'])} free on disk"
+    if usage["uploads"]:
+        text += f"<br>{usage['uploads']} files are waiting for upload"
+    if usage["out_of_space"]:
+        text += "<br><b>The cache is out of space</b>"
+
+    cleanups = rclone_cache.get_cleanups(settings)
+    if cleanups:
+        last = cleanups[-1]
+        text += (
+            f"<br>Last cleanup removed {last['removed_files']} least recently used files "
+            f"({rclone_cache.format_size(last['freed'])})"
+        )
+    return text
+
+
+def update_cache_usage(dialog: ap.Dialog, cache_path):
+    # The cache folder is only walked here, in the background
+    usage = rclone_cache.get_usage(
+        cache_path, rclone_rc.get_connection(ctx.workspace_id), settings
+    )
+    if not usage["mounted"]:
+        usage["bytes_used"] = rclone_cache.count_size(cache_path)
+    dialog.set_value(cache_usage_var, get_cache_usage_text(cache_path, usage))
+
+
+def get_health_text():
+    supervisor = rclone_supervisor.get_supervisor(ctx.workspace_id)
+    if supervisor is None:
+        return "Drive health is shown while the drive is mounted"
+
+    metrics = supervisor.get_metrics()
+    text = []
+    if metrics["latency"] is not None:
+        text.append(f"Response time <b>{metrics['latency'] * 1000:.0f} ms</b>")
+    if metrics["error_rate"] is not None:
+        text.append(f"<b>{metrics['error_rate']:.0%}</b> failed transfers")
+    if metrics["restarts"]:
+        text.append(f"mounted again {metrics['restarts']} times")
+    if not text:
+        return "Checking drive health"
+    return ", ".join(text)
+
+
+def get_mounted_path():
+    drive = aps.Settings(ctx.workspace_id).get("rclone-drive")
+    if not drive:
+        return None
+    if isWin():
+        drive = f"{drive}:\\"
+    if not os.path.exists(drive):
+        return None
+    return drive
+
+
+def get_benchmark_text():
+    try:
+        result = json.loads(settings.get("profile_benchmark"))
+    except (TypeError, ValueError):
+        result = None
+    if not result:
+        return "Measure the mounted drive to find the best profile"
+
+    text = []
+    if result["sequential_speed"] is not None:
+        text.append(
+            f"<b>{result['sequential_speed'] / (1024 * 1024):.0f} MB/s</b> sequential"
+        )
+    if result["small_files_per_second"] is not None:
+        text.append(f"<b>{result['small_files_per_second']:.0f}</b> small files/s")
+    return ", ".join(text) + f"<br>Recommended: <b>{result['recommended']}</b>"
+
+
+def run_benchmark(dialog: ap.Dialog, path: str):
+    progress = ap.Progress("Cloud Drive", "Measuring drive speed", infinite=True)
+    try:
+        result = rclone_profile.benchmark(path)
+    except OSError as e:
+        print(e)
+        result = None
+    progress.finish()
+
+    if not result:
+        ui.show_error("Benchmark failed", "The drive has no files to measure")
+        return
+
+    settings.set("profile_benchmark", json.dumps(result))
+    settings.store()
+    dialog.set_value(benchmark_var, get_benchmark_text())
+    dialog.set_value("profile_var", result["recommended"])
+
+
+def benchmark_clicked(dialog: ap.Dialog):
+    path = get_mounted_path()
+    if path is None:
+        ui.show_info("Cloud Drive is not mounted", "Mount the drive to measure it")
+        return
+    ctx.run_async(run_benchmark, dialog, path)
 
 
 def clear_cache(dialog: ap.Dialog):
@@ -83,14 +233,38 @@ def open_dialog():
     dialog.add_text("Cache Location").add_input(
         cache_path, browse=ap.BrowseType.Folder, var="cache_var"
     )
+    max_size, min_free_space = get_cache_limits()
+    dialog.add_text("Max Cache Size\t").add_input(
+        max_size, placeholder="GB", var="cache_max_size_var"
+    )
+    dialog.add_text("Keep Free on Disk").add_input(
+        min_free_space, placeholder="GB", var="cache_min_free_space_var"
+    )
+    dialog.add_info(
+        "The free space on disk is checked when the Cloud Drive is mounted,<br>not while it is running"
+    )
+    # Shows the last known size first, update_cache_usage reads the current one
+    dialog.add_info(
+        get_cache_usage_text(
+            cache_path, rclone_cache.get_usage(cache_path, None, settings)
+        ),
+        var=cache_usage_var,
+    )
+    dialog.add_info(get_health_text())
+    dialog.add_text("Profile\t\t").add_dropdown(
+        get_profile_name(), list(rclone_profile.PROFILES.keys()), var="profile_var"
+    )
+    dialog.add_info(get_benchmark_text(), var=benchmark_var)
 
     if ctx.icon:
         dialog.icon = ctx.icon
 
     dialog.add_button("Apply", callback=store_settings).add_button(
         "Clear Cache", callback=clear_cache, enabled=is_not_empty, primary=False
-    )
+    ).add_button("Benchmark", callback=benchmark_clicked, primary=False)
     dialog.show()
 
+    ctx.run_async(update_cache_usage, dialog, cache_path)
+
 
 ctx.run_async(rclone_install.check_winfsp_and_rclone, open_dialog)
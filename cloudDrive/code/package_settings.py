@@ -5,6 +5,7 @@ import string
 import random
 
 import rclone_config_helper as rclone_config
+import rclone_crypto_helper as rclone_crypto
 
 ctx = ap.get_context()
 ui = ap.UI()
@@ -183,9 +184,7 @@ def install_modules():
 
 
 def generate_secret_key(password: str, salt: bytes) -> str:
-    from Crypto.Protocol.KDF import PBKDF2
-
-    return PBKDF2(password, salt, dkLen=32)
+    return rclone_crypto.generate_secret_key(password, salt)
 
 
 def encrypt(data: str, secret_key: bytes, salt: bytes) -> str:
@@ -199,20 +198,7 @@ def encrypt(data: str, secret_key: bytes, salt: bytes) -> str:
 
 
 def decrypt(encrypted: str, password: str) -> str:
-    from Crypto.Cipher import AES
-    from Crypto.Util.Padding import unpad
-
-    bytes_encrypted = bytes.fromhex(encrypted)
-    iv = bytes_encrypted[:16]
-    ciphered_data = bytes_encrypted[16:-32]
-
-    salt = bytes_encrypted[-32:]
-    secret_key = generate_secret_key(password, salt)
-
-    cipher = AES.new(secret_key, AES.MODE_CBC, iv=iv)
-    original_data = unpad(cipher.decrypt(ciphered_data), AES.block_size)
-
-    return original_data.decode()
+    return rclone_crypto.decrypt(encrypted, password)
 
 
 def get_configuration(dialog: ap.Dialog):
@@ -320,6 +306,7 @@ def enter_new_config(dialog: ap.Dialog):
 
     settings.set("Config", "")
     settings.store()
+    rclone_crypto.clear()
     create_dialog()
 
 
@@ -336,6 +323,7 @@ def clear_config(dialog: ap.Dialog):
 
     settings.set("Config", "")
     settings.store()
+    rclone_crypto.clear()
     ui.show_success("Configuration has been cleared")
     dialog.close()
 
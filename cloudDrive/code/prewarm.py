@@ -0,0 +1,106 @@
+import anchorpoint as ap
+import apsync as aps
+import os
+import platform
+
+import rclone_cache_helper as rclone_cache
+import rclone_prewarm_helper as rclone_prewarm
+import rclone_rc_helper as rclone_rc
+
+ctx = ap.get_context()
+ui = ap.UI()
+
+
+def get_mounted_path():
+    drive = aps.Settings(ctx.workspace_id).get("rclone-drive")
+    if not drive:
+        return None
+    if platform.system() == "Windows":
+        drive = f"{drive}:\\"
+    if not os.path.exists(drive):
+        return None
+    return os.path.normcase(os.path.normpath(drive))
+
+
+def is_on_drive(path, drive):
+    # Compares whole folder names, X:/Drive2 is not on a drive at X:/Drive
+    path = os.path.normcase(os.path.normpath(path))
+    try:
+        return os.path.commonpath([path, drive]) == drive
+    except ValueError:
+        return False
+
+
+def show_report(report, title):
+    size = rclone_cache.format_size(report["bytes"])
+    if report["downloaded"] is None:
+        description = f"{report['files']} files ({size}) are in the cache"
+    else:
+        cached = rclone_cache.format_size(report["bytes"] - report["downloaded"])
+        description = f"{report['files']} files ({size}), {cached} were already cached"
+
+    if report["canceled"]:
+        ui.show_info(f"{title} canceled", description)
+    elif report["failed"]:
+        ui.show_info(
+            f"{title}: {report['failed']} files failed", "Check Anchorpoint Console"
+        )
+    else:
+        ui.show_success(title, description)
+
+
+def prewarm(paths, title):
+    progress = ap.Progress(title, "Loading files into the cache", cancelable=True)
+    report = rclone_prewarm.warm(
+        paths, rclone_rc.get_connection(ctx.workspace_id), progress
+    )
+    progress.finish()
+    show_report(report, title)
+
+
+def warm_on_mount(paths, title):
+    # rclone removes the least recently used files when the cache is full, also
+    # the ones of these folders. Folders that cannot fit are not added at all
+    pinned = set(rclone_prewarm.get_pinned(ctx.workspace_id) + list(paths))
+    size = sum(rclone_prewarm.get_sizes(rclone_prewarm.collect_files(pinned)).values())
+    max_size, _ = rclone_cache.get_limits(aps.Settings("rclone"))
+    if size > max_size * rclone_cache.GB:
+        ui.show_error(
+            "Larger than the cache",
+            f"The folders need {rclone_cache.format_size(size)}, the cache is limited to {max_size:g} GB",
+        )
+        return
+
+    rclone_prewarm.pin(ctx.workspace_id, paths)
+    prewarm(paths, title)
+
+
+def main():
+    paths = ctx.selected_folders or ctx.selected_files or [ctx.path]
+    drive = get_mounted_path()
+    if drive is None or not all(is_on_drive(path, drive) for path in paths):
+        ui.show_info(
+            "Not on the Cloud Drive",
+            "Only folders on the mounted Cloud Drive can be cached",
+        )
+        return
+
+    if ctx.inputs.get("mode") != "pin":
+        ctx.run_async(prewarm, paths, "Cache Pre-warmed")
+        return
+
+    pinned = {
+        os.path.normcase(path) for path in rclone_prewarm.get_pinned(ctx.workspace_id)
+    }
+    if all(os.path.normcase(path) in pinned for path in paths):
+        rclone_prewarm.unpin(ctx.workspace_id, paths)
+        ui.show_success(
+            "Not warmed on mount", "The files are not loaded after a mount anymore"
+        )
+        return
+
+    # These folders are loaded again after every mount
+    ctx.run_async(warm_on_mount, paths, "Cache Warmed on Mount")
+
+
+main()
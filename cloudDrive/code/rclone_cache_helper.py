@@ -0,0 +1,211 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import apsync as aps
+
+# Limits of the VFS cache in GB, rclone removes the least recently used files
+# when the cache grows beyond the max size
+DEFAULT_MAX_SIZE = 100
+DEFAULT_MIN_FREE_SPACE = 10
+# The max size is never set lower than this, so that open files still fit
+MIN_CACHE_SIZE = 1
+MAX_CLEANUP_HISTORY = 10
+# Walking a large cache takes a while, the last counted size is reused for a day
+SIZE_MAX_AGE = 24 * 60 * 60
+
+GB = 1024 * 1024 * 1024
+
+# vfs cache: cleaned: objects 12 (was 40) in use 1, to upload 0, uploading 0, total size 9.5Gi (was 12.1Gi)
+CLEANED_PATTERN = re.compile(
+    r"objects (\d+) \(was (\d+)\).*total size ([\d.]+\s*\w*) \(was ([\d.]+\s*\w*)\)"
+)
+SIZE_PATTERN = re.compile(r"([\d.]+)\s*([KMGTP]?)")
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4, "P": 1024**5}
+
+
+def get_limits(local_settings):
+    def to_number(value, default):
+        try:
+            return max(float(value), 0)
+        except (TypeError, ValueError):
+            return default
+
+    max_size = to_number(local_settings.get("cache_max_size"), DEFAULT_MAX_SIZE)
+    min_free_space = to_number(
+        local_settings.get("cache_min_free_space"), DEFAULT_MIN_FREE_SPACE
+    )
+    return max_size, min_free_space
+
+
+def get_folder_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return size
+
+
+def get_stored_size(local_settings):
+    try:
+        stored = json.loads(local_settings.get("cache_size"))
+        if time.time() - stored["time"] < SIZE_MAX_AGE:
+            return stored["bytes"]
+    except (TypeError, ValueError, KeyError):
+        pass
+    return None
+
+
+def store_size(size):
+    local_settings = aps.Settings("rclone")
+    local_settings.set("cache_size", json.dumps({"bytes": size, "time": time.time()}))
+    local_settings.store()
+
+
+def count_size(cache_path):
+    # Walks the whole cache, never call this on the UI thread
+    size = get_folder_size(os.path.join(cache_path, "vfs"))
+    store_size(size)
+    return size
+
+
+_counting = set()
+_counting_lock = threading.Lock()
+
+
+def count_size_in_background(cache_path):
+    with _counting_lock:
+        if cache_path in _counting:
+            return
+        _counting.add(cache_path)
+
+    def run():
+        try:
+            count_size(cache_path)
+        except Exception as e:
+            print(f"Could not count the Cloud Drive cache size: {e}")
+        finally:
+            with _counting_lock:
+                _counting.discard(cache_path)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_effective_max_size(cache_path, max_size, min_free_space, used):
+    # The cache may only grow as far as the disk keeps min_free_space free
+    limit = max_size * GB
+    try:
+        free = shutil.disk_usage(cache_path).free
+    except OSError:
+        return limit
+    available = used + free - min_free_space * GB
+    return max(min(limit, available), MIN_CACHE_SIZE * GB)
+
+
+def get_arguments(cache_path, local_settings):
+    # The free space is only taken into account when the drive is mounted,
+    # rclone cannot change the max size of a running mount
+    max_size, min_free_space = get_limits(local_settings)
+    used = get_stored_size(local_settings)
+    if used is None:
+        # Counted for the next mount. Until then only the max size applies, an
+        # existing cache would otherwise be evicted to fit the free space
+        count_size_in_background(cache_path)
+        effective = max_size * GB
+    else:
+        effective = get_effective_max_size(cache_path, max_size, min_free_space, used)
+    return ["--vfs-cache-max-size", f"{int(effective // (1024 * 1024))}M"]
+
+
+def parse_size(text):
+    match = SIZE_PATTERN.match(text.strip())
+    if not match:
+        return 0
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def parse_cleanup(message):
+    match = CLEANED_PATTERN.search(message)
+    if not match:
+        return None
+    objects, was_objects, size, was_size = match.groups()
+    return {
+        "removed_files": max(int(was_objects) - int(objects), 0),
+        "freed": max(parse_size(was_size) - parse_size(size), 0),
+        "size": parse_size(size),
+        "time": time.time(),
+    }
+
+
+def record_cleanup(message):
+    # Only cleanups that removed files are shown in the settings
+    cleanup = parse_cleanup(message)
+    if not cleanup or not cleanup["removed_files"]:
+        return None
+
+    local_settings = aps.Settings("rclone")
+    history = get_cleanups(local_settings)
+    history.append(cleanup)
+    local_settings.set("cache_cleanups", json.dumps(history[-MAX_CLEANUP_HISTORY:]))
+    local_settings.set(
+        "cache_size", json.dumps({"bytes": cleanup["size"], "time": time.time()})
+    )
+    local_settings.store()
+    return cleanup
+
+
+def get_cleanups(local_settings):
+    try:
+        history = json.loads(local_settings.get("cache_cleanups"))
+    except (TypeError, ValueError):
+        return []
+    return history if isinstance(history, list) else []
+
+
+def get_usage(cache_path, connection=None, local_settings=None):
+    # Reads the numbers from the running mount, or the last counted size when
+    # it is not mounted. bytes_used is None if the size has not been counted
+    usage = None
+    if connection is not None:
+        try:
+            disk_cache = connection.call("vfs/stats").get("diskCache") or {}
+            usage = {
+                "bytes_used": disk_cache.get("bytesUsed", 0),
+                "files": disk_cache.get("files", 0),
+                "uploads": disk_cache.get("uploadsInProgress", 0)
+                + disk_cache.get("uploadsQueued", 0),
+                "out_of_space": disk_cache.get("outOfSpace", False),
+                "mounted": True,
+            }
+            store_size(usage["bytes_used"])
+        except Exception:
+            usage = None
+
+    if usage is None:
+        local_settings = local_settings or aps.Settings("rclone")
+        usage = {
+            "bytes_used": get_stored_size(local_settings),
+            "files": None,
+            "uploads": 0,
+            "out_of_space": False,
+            "mounted": False,
+        }
+
+    try:
+        usage["free"] = shutil.disk_usage(cache_path).free
+    except OSError:
+        usage["free"] = None
+    return usage
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
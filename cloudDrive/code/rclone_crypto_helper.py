@@ -0,0 +1,82 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+# PBKDF2 is slow on purpose. Derived keys and the decrypted configuration are
+# kept for the lifetime of the Anchorpoint process, but not longer than this
+CACHE_SECONDS = 8 * 60 * 60
+
+# Entries are looked up by an HMAC with a random key of this process. A plain
+# hash of the password would be a fast way to guess it, which is what PBKDF2
+# is meant to prevent
+_hmac_key = os.urandom(32)
+_derived_keys = {}
+_decrypted = {}
+_lock = threading.Lock()
+
+
+def _cache_key(*values) -> str:
+    digest = hmac.new(_hmac_key, digestmod=hashlib.sha256)
+    for value in values:
+        value = value if isinstance(value, bytes) else value.encode("utf-8")
+        # The length keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(len(value).to_bytes(8, "big"))
+        digest.update(value)
+    return digest.hexdigest()
+
+
+def _get(cache, key):
+    with _lock:
+        now = time.monotonic()
+        for expired in [k for k, (_, expires) in cache.items() if expires < now]:
+            del cache[expired]
+        entry = cache.get(key)
+    return entry[0] if entry else None
+
+
+def _set(cache, key, value):
+    with _lock:
+        cache[key] = (value, time.monotonic() + CACHE_SECONDS)
+
+
+def clear():
+    # Called when the configuration or the key changes
+    with _lock:
+        _derived_keys.clear()
+        _decrypted.clear()
+
+
+def generate_secret_key(password: str, salt: bytes) -> bytes:
+    from Crypto.Protocol.KDF import PBKDF2
+
+    key = _cache_key(password, salt)
+    secret_key = _get(_derived_keys, key)
+    if secret_key is None:
+        secret_key = PBKDF2(password, salt, dkLen=32)
+        _set(_derived_keys, key, secret_key)
+    return secret_key
+
+
+def decrypt(encrypted: str, password: str) -> str:
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import unpad
+
+    key = _cache_key(encrypted, password)
+    original_data = _get(_decrypted, key)
+    if original_data is not None:
+        return original_data
+
+    bytes_encrypted = bytes.fromhex(encrypted)
+    iv = bytes_encrypted[:16]
+    ciphered_data = bytes_encrypted[16:-32]
+
+    salt = bytes_encrypted[-32:]
+    secret_key = generate_secret_key(password, salt)
+
+    cipher = AES.new(secret_key, AES.MODE_CBC, iv=iv)
+    original_data = unpad(cipher.decrypt(ciphered_data), AES.block_size).decode()
+
+    _set(_decrypted, key, original_data)
+    return original_data
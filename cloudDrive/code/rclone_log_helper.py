@@ -0,0 +1,180 @@
+import json
+import re
+import time
+from collections import deque
+
+import anchorpoint as ap
+
+# Message types that the mount reacts to. All markers are matched with one
+# combined regex, so every log line is only scanned once. Upload progress
+# is read from the remote control instead of the log
+MOUNTED = "mounted"
+MOUNT_FAILED = "mount_failed"
+WRONG_CREDENTIALS = "wrong_credentials"
+WRONG_ACCESS_KEY = "wrong_access_key"
+CACHE_CLEANED = "cache_cleaned"
+
+MESSAGE_MARKERS = {
+    "The service rclone has been started": MOUNTED,
+    "Mount failed": MOUNT_FAILED,
+    "SignatureDoesNotMatch": WRONG_CREDENTIALS,
+    "InvalidAccessKeyId": WRONG_ACCESS_KEY,
+    "vfs cache: cleaned:": CACHE_CLEANED,
+}
+MESSAGE_PATTERN = re.compile("|".join(re.escape(marker) for marker in MESSAGE_MARKERS))
+
+# Throughput is averaged over this many seconds
+THROUGHPUT_WINDOW = 10
+# Upload progress is sent to the UI at most this often
+UI_INTERVAL = 0.5
+
+
+class LogEvent:
+    def __init__(self, kind, level, message, record):
+        self.kind = kind
+        self.level = level
+        self.message = message
+        self.record = record
+
+
+def parse_line(line):
+    # rclone writes JSON logs because of --use-json-log, some messages of
+    # WinFsp and the service are plain text
+    line = line.strip()
+    record = None
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+
+    if record is None:
+        level = ""
+        message = line
+    else:
+        level = record.get("level", "")
+        message = record.get("msg", "")
+
+    match = MESSAGE_PATTERN.search(message)
+    kind = MESSAGE_MARKERS[match.group(0)] if match else None
+
+    return LogEvent(kind, level, message, record)
+
+
+def is_upload(transfer):
+    # The totals of core/stats also count files that are read from the cloud.
+    # Uploads go from the cache to the cloud and have a destination, reads from
+    # the cloud have none. Older rclone versions do not list either of them
+    return bool(transfer.get("dstFs")) or "srcFs" not in transfer
+
+
+def format_speed(bytes_per_second):
+    for unit in ("B/s", "KiB/s", "MiB/s", "GiB/s"):
+        if bytes_per_second < 1024 or unit == "GiB/s":
+            return f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024
+
+
+class UploadMetrics:
+    # Filled from the rclone remote control, see rclone_rc_helper.py
+    def __init__(self, window=THROUGHPUT_WINDOW):
+        self.window = window
+        self.samples = deque()
+        self.errors = 0
+        self.in_flight_bytes = 0
+        self.in_flight_size = 0
+        self.transferring = []
+        self.pending = 0
+        self.batch_size = 0
+        self.cache_bytes = 0
+        self.cache_files = 0
+
+    def on_stats(self, stats, now=None):
+        now = time.monotonic() if now is None else now
+        transferring = [t for t in stats.get("transferring") or [] if is_upload(t)]
+        self.samples.append((now, sum(t.get("speed", 0) for t in transferring)))
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+
+        self.errors = stats.get("errors", 0)
+        self.in_flight_bytes = sum(t.get("bytes", 0) for t in transferring)
+        self.in_flight_size = sum(t.get("size", 0) for t in transferring)
+        self.transferring = [t.get("name", "") for t in transferring]
+
+    def on_vfs_stats(self, vfs_stats):
+        disk_cache = vfs_stats.get("diskCache") or {}
+        self.pending = disk_cache.get("uploadsInProgress", 0) + disk_cache.get(
+            "uploadsQueued", 0
+        )
+        # Files that are queued while uploading belong to the same batch
+        self.batch_size = max(self.batch_size, self.pending)
+        self.cache_bytes = disk_cache.get("bytesUsed", 0)
+        self.cache_files = disk_cache.get("files", 0)
+
+    def on_update(self, stats, vfs_stats):
+        self.on_stats(stats)
+        self.on_vfs_stats(vfs_stats)
+
+    @property
+    def throughput(self):
+        # Upload bytes per second, averaged over the rolling window
+        if not self.samples:
+            return 0.0
+        return sum(speed for _, speed in self.samples) / len(self.samples)
+
+    @property
+    def queue_depth(self):
+        return self.pending
+
+    @property
+    def fraction(self):
+        partial = (
+            self.in_flight_bytes / self.in_flight_size if self.in_flight_size else 0
+        )
+        if self.batch_size > 1:
+            # Count the files that are uploading with their progress
+            done = self.batch_size - self.pending
+            return min((done + partial) / self.batch_size, 1.0)
+        return min(partial, 1.0)
+
+    def reset(self):
+        self.batch_size = 0
+
+
+class UploadProgress:
+    # Shows a "Syncing Files" progress while uploads are queued,
+    # updates are throttled so that busy mounts do not flood the UI
+    def __init__(self, metrics, interval=UI_INTERVAL):
+        self.metrics = metrics
+        self.interval = interval
+        self.progress = None
+        self.last_update = 0
+
+    def update(self):
+        metrics = self.metrics
+        if metrics.queue_depth <= 0:
+            self.finish()
+            return
+
+        now = time.monotonic()
+        if self.progress and now - self.last_update < self.interval:
+            return
+        self.last_update = now
+
+        text = f"{int(metrics.fraction * 100)}% at {format_speed(metrics.throughput)}"
+        if metrics.queue_depth > 1:
+            text += f", {metrics.queue_depth} files left"
+        elif len(metrics.transferring) == 1:
+            text += f", {metrics.transferring[0]}"
+
+        if not self.progress:
+            self.progress = ap.Progress("Syncing Files", text, infinite=False)
+        else:
+            self.progress.set_text(text)
+        self.progress.report_progress(metrics.fraction)
+
+    def finish(self):
+        if self.progress:
+            self.progress.finish()
+            self.progress = None
+        self.metrics.reset()
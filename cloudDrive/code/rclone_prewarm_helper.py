@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import apsync as aps
+
+# Reading a file through the mount downloads it into the VFS cache, so that
+# the next open is served from the local disk
+PREWARM_WORKERS = 4
+READ_SIZE = 8 * 1024 * 1024
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            files.extend(os.path.join(root, name) for name in names)
+    return files
+
+
+def get_sizes(files):
+    sizes = {}
+    for file in files:
+        try:
+            sizes[file] = os.path.getsize(file)
+        except OSError:
+            pass
+    return sizes
+
+
+def _read_file(path, on_bytes, canceled):
+    with open(path, "rb") as file:
+        while not canceled():
+            data = file.read(READ_SIZE)
+            if not data:
+                break
+            on_bytes(len(data))
+
+
+def get_cache_bytes(connection):
+    if connection is None:
+        return None
+    try:
+        return (connection.call("vfs/stats").get("diskCache") or {}).get("bytesUsed")
+    except Exception:
+        return None
+
+
+def warm(paths, connection=None, progress=None, workers=PREWARM_WORKERS):
+    # Returns a report with the number of files and bytes that were read and
+    # how many of them had to be downloaded
+    sizes = get_sizes(collect_files(paths))
+    total = max(sum(sizes.values()), 1)
+
+    cache_before = get_cache_bytes(connection)
+    lock = threading.Lock()
+    state = {"read": 0, "files": 0, "failed": 0}
+
+    def canceled():
+        return progress is not None and progress.canceled
+
+    def on_bytes(count):
+        with lock:
+            state["read"] += count
+            read = state["read"]
+        if progress is not None:
+            progress.report_progress(min(read / total, 1.0))
+
+    def run(file):
+        if canceled():
+            return
+        try:
+            _read_file(file, on_bytes, canceled)
+        except OSError as e:
+            print(f"Could not load {file} into the cache: {e}")
+            with lock:
+                state["failed"] += 1
+            return
+        with lock:
+            state["files"] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run, sizes.keys()))
+
+    report = {
+        "files": state["files"],
+        "failed": state["failed"],
+        "bytes": state["read"],
+        "downloaded": None,
+        "canceled": canceled(),
+    }
+
+    cache_after = get_cache_bytes(connection)
+    if cache_before is not None and cache_after is not None:
+        report["downloaded"] = min(max(cache_after - cache_before, 0), state["read"])
+    return report
+
+
+def get_pinned(workspace_id):
+    try:
+        pinned = json.loads(aps.Settings(workspace_id).get("rclone-pinned"))
+    except (TypeError, ValueError):
+        return []
+    return pinned if isinstance(pinned, list) else []
+
+
+def set_pinned(workspace_id, pinned):
+    local_settings = aps.Settings(workspace_id)
+    local_settings.set("rclone-pinned", json.dumps(sorted(set(pinned))))
+    local_settings.store()
+
+
+def pin(workspace_id, paths):
+    set_pinned(workspace_id, get_pinned(workspace_id) + list(paths))
+
+
+def unpin(workspace_id, paths):
+    removed = {os.path.normcase(path) for path in paths}
+    set_pinned(
+        workspace_id,
+        [
+            path
+            for path in get_pinned(workspace_id)
+            if os.path.normcase(path) not in removed
+        ],
+    )
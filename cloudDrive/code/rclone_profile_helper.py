@@ -0,0 +1,176 @@
+import os
+import time
+
+# Mount settings for different kinds of projects. Changing the profile
+# takes effect the next time the drive is mounted
+PROFILES = {
+    "Default": {
+        "vfs_read_chunk_size": "512M",
+        "vfs_read_chunk_size_limit": "off",
+        "vfs_read_ahead": "0",
+        "buffer_size": "16M",
+        "transfers": 10,
+        "checkers": 8,
+        "dir_cache_time": "5s",
+    },
+    # Large image sequences and video that are played back from the drive
+    "Editorial Streaming": {
+        "vfs_read_chunk_size": "64M",
+        "vfs_read_chunk_size_limit": "2G",
+        "vfs_read_ahead": "1G",
+        "buffer_size": "256M",
+        "transfers": 4,
+        "checkers": 8,
+        "dir_cache_time": "1m",
+    },
+    # Source code, textures and other projects with thousands of small files
+    "Many Small Files": {
+        "vfs_read_chunk_size": "8M",
+        "vfs_read_chunk_size_limit": "64M",
+        "vfs_read_ahead": "0",
+        "buffer_size": "8M",
+        "transfers": 32,
+        "checkers": 32,
+        "dir_cache_time": "30s",
+    },
+    # Slow or metered connections, fewer parallel requests and more caching
+    "Bandwidth-limited Remote": {
+        "vfs_read_chunk_size": "16M",
+        "vfs_read_chunk_size_limit": "256M",
+        "vfs_read_ahead": "0",
+        "buffer_size": "8M",
+        "transfers": 2,
+        "checkers": 4,
+        "dir_cache_time": "10m",
+    },
+}
+DEFAULT_PROFILE = "Default"
+
+# Benchmark limits, so that it finishes in about half a minute
+BENCHMARK_SCAN_FILES = 5000
+BENCHMARK_SEQUENTIAL_BYTES = 512 * 1024 * 1024
+BENCHMARK_SMALL_FILE_SIZE = 1024 * 1024
+BENCHMARK_SMALL_FILES = 200
+BENCHMARK_SECONDS = 15
+READ_SIZE = 4 * 1024 * 1024
+
+# Below this sequential speed (bytes per second) the remote counts as slow
+SLOW_REMOTE_SPEED = 20 * 1024 * 1024
+
+
+def get_profile(name):
+    return PROFILES.get(name, PROFILES[DEFAULT_PROFILE])
+
+
+def get_arguments(name):
+    profile = get_profile(name)
+    return [
+        "--vfs-read-chunk-size",
+        profile["vfs_read_chunk_size"],
+        "--vfs-read-chunk-size-limit",
+        profile["vfs_read_chunk_size_limit"],
+        "--vfs-read-ahead",
+        profile["vfs_read_ahead"],
+        "--buffer-size",
+        profile["buffer_size"],
+        "--transfers",
+        str(profile["transfers"]),
+        "--checkers",
+        str(profile["checkers"]),
+        "--dir-cache-time",
+        profile["dir_cache_time"],
+    ]
+
+
+def _scan(path):
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            file = os.path.join(root, name)
+            try:
+                files.append((os.path.getsize(file), file))
+            except OSError:
+                continue
+            if len(files) >= BENCHMARK_SCAN_FILES:
+                return files
+    return files
+
+
+def _read(path, limit, deadline):
+    read = 0
+    with open(path, "rb") as file:
+        while read < limit and time.monotonic() < deadline:
+            data = file.read(min(READ_SIZE, limit - read))
+            if not data:
+                break
+            read += len(data)
+    return read
+
+
+def benchmark(path):
+    # Reads existing files of the mounted drive, nothing is written. Files that
+    # are in the local cache already make the result look faster than it is
+    files = _scan(path)
+    if not files:
+        return None
+
+    small_files = [
+        file for size, file in files if 0 < size <= BENCHMARK_SMALL_FILE_SIZE
+    ]
+    large_files = sorted(
+        (item for item in files if item[0] > BENCHMARK_SMALL_FILE_SIZE), reverse=True
+    )
+
+    sequential_speed = None
+    if large_files:
+        deadline = time.monotonic() + BENCHMARK_SECONDS
+        start = time.monotonic()
+        read = 0
+        for size, file in large_files:
+            if read >= BENCHMARK_SEQUENTIAL_BYTES or time.monotonic() >= deadline:
+                break
+            try:
+                read += _read(file, BENCHMARK_SEQUENTIAL_BYTES - read, deadline)
+            except OSError:
+                continue
+        elapsed = time.monotonic() - start
+        if read and elapsed > 0:
+            sequential_speed = read / elapsed
+
+    small_files_per_second = None
+    latency = None
+    if small_files:
+        deadline = time.monotonic() + BENCHMARK_SECONDS
+        start = time.monotonic()
+        count = 0
+        for file in small_files[:BENCHMARK_SMALL_FILES]:
+            if time.monotonic() >= deadline:
+                break
+            try:
+                _read(file, BENCHMARK_SMALL_FILE_SIZE, deadline)
+                count += 1
+            except OSError:
+                continue
+        elapsed = time.monotonic() - start
+        if count and elapsed > 0:
+            small_files_per_second = count / elapsed
+            latency = elapsed / count
+
+    return {
+        "sequential_speed": sequential_speed,
+        "small_files_per_second": small_files_per_second,
+        "latency": latency,
+        "small_file_share": len(small_files) / len(files),
+        "recommended": recommend_profile(
+            sequential_speed, len(small_files) / len(files)
+        ),
+    }
+
+
+def recommend_profile(sequential_speed, small_file_share):
+    if sequential_speed is not None and sequential_speed < SLOW_REMOTE_SPEED:
+        return "Bandwidth-limited Remote"
+    if small_file_share > 0.8:
+        return "Many Small Files"
+    return "Editorial Streaming"
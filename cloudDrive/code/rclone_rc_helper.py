@@ -0,0 +1,118 @@
+import os
+import secrets
+import socket
+import threading
+
+import requests
+
+# The mount is started with rclone's remote control API on localhost, so that
+# transfers and the VFS cache can be read directly instead of parsing logs
+RC_HOST = "127.0.0.1"
+RC_USER = "anchorpoint"
+RC_TIMEOUT = 2
+POLL_INTERVAL = 1
+# The poller stops when the mount does not answer this many times in a row
+MAX_FAILED_POLLS = 10
+
+# Connections by workspace. They are only kept in memory, so that the password
+# of the remote control is never written to disk. This module is not reloaded
+# by mount.py, so that the settings and pinning actions find the connection
+_connections = {}
+
+
+class RcConnection:
+    def __init__(self, port, password, host=RC_HOST):
+        self.port = int(port)
+        self.password = password
+        self.host = host
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def call(self, method, params=None, timeout=RC_TIMEOUT):
+        response = requests.post(
+            f"{self.url}/{method}",
+            json=params or {},
+            auth=(RC_USER, self.password),
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def is_alive(self):
+        try:
+            self.call("rc/noop")
+            return True
+        except (requests.RequestException, ValueError):
+            return False
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((RC_HOST, 0))
+        return s.getsockname()[1]
+
+
+def create_connection():
+    return RcConnection(get_free_port(), secrets.token_hex(16))
+
+
+def get_arguments(connection):
+    return ["--rc", f"--rc-addr={connection.host}:{connection.port}"]
+
+
+def get_environment(connection):
+    # The credentials are passed to rclone through its environment, the
+    # command line can be read by every other process
+    environment = os.environ.copy()
+    environment["RCLONE_RC_USER"] = RC_USER
+    environment["RCLONE_RC_PASS"] = connection.password
+    return environment
+
+
+def store_connection(connection, workspace_id):
+    # Other actions (cache settings, pinning) talk to the same mount
+    _connections[workspace_id] = connection
+
+
+def get_connection(workspace_id):
+    return _connections.get(workspace_id)
+
+
+class RcPoller(threading.Thread):
+    # Calls on_update(stats, vfs_stats) with the results of core/stats and
+    # vfs/stats every interval seconds until stop() is called or the mount is gone
+    def __init__(self, connection, on_update, interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.connection = connection
+        self.on_update = on_update
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.connected = False
+
+    def poll(self):
+        stats = self.connection.call("core/stats")
+        vfs_stats = self.connection.call("vfs/stats")
+        return stats, vfs_stats
+
+    def run(self):
+        failed_polls = 0
+        while not self.stopped.is_set():
+            try:
+                stats, vfs_stats = self.poll()
+            except (requests.RequestException, ValueError):
+                failed_polls += 1
+                if failed_polls >= MAX_FAILED_POLLS:
+                    break
+            else:
+                failed_polls = 0
+                self.connected = True
+                try:
+                    self.on_update(stats, vfs_stats)
+                except Exception as e:
+                    print(f"Cloud Drive stats could not be shown: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,272 @@
+import os
+import platform
+import subprocess
+import threading
+import time
+from collections import deque
+
+import apsync as aps
+
+# Watches a running mount and mounts it again when rclone has crashed or the
+# drive stopped answering. This module is not reloaded by mount.py, so that
+# there is only one supervisor per workspace
+CHECK_INTERVAL = 15
+# A listing of the drive that takes longer counts as a failed check
+MOUNT_TIMEOUT = 10
+# Restart after this many failed checks in a row
+MAX_FAILED_CHECKS = 2
+# Time that a stopped mount gets to release the drive letter or folder
+UNMOUNT_TIMEOUT = 10
+RESTART_BACKOFF = 5
+MAX_RESTART_BACKOFF = 300
+METRICS_WINDOW = 20
+
+# Warn in the console above these values
+SLOW_LATENCY = 2.0
+HIGH_ERROR_RATE = 0.2
+
+_supervisors = {}
+_lock = threading.Lock()
+
+
+def get_mount_path(drive):
+    if platform.system() == "Windows":
+        return f"{drive}:\\"
+    return drive
+
+
+def _wait_until_gone(path, timeout=UNMOUNT_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not os.path.exists(path):
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def unmount(drive, connection=None, process=None):
+    # Stops rclone and releases the mount point, so that the drive can be
+    # mounted to the same letter or folder again
+    if connection is not None:
+        try:
+            connection.call("core/quit")
+        except Exception:
+            pass
+    if process is not None and process.poll() is None:
+        process.kill()
+
+    path = get_mount_path(drive)
+    if platform.system() == "Windows":
+        # WinFsp releases the drive letter when the rclone process is gone
+        if process is None:
+            subprocess.run(
+                ["taskkill", "/IM", "rclone.exe", "/F"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        _wait_until_gone(path)
+    else:
+        # A hanging daemon keeps the folder mounted, it does not answer core/quit
+        try:
+            subprocess.run(
+                ["diskutil", "unmount", "force", path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=UNMOUNT_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+
+class MountSupervisor(threading.Thread):
+    def __init__(self, workspace_id, drive, connection, process, restart):
+        super().__init__(daemon=True)
+        self.workspace_id = workspace_id
+        self.drive = drive
+        self.connection = connection
+        self.process = process
+        self.restart = restart
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+        self.failed_checks = 0
+        self.backoff = RESTART_BACKOFF
+        self.restarts = 0
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.rc_latencies = deque(maxlen=METRICS_WINDOW)
+        self.stats = deque(maxlen=METRICS_WINDOW)
+        self.warnings = set()
+        self.probe = None
+
+    def update(self, drive, connection, process, restart):
+        # Called when the mount has been started again
+        with self.lock:
+            self.restart = restart
+            self.drive = drive
+            self.connection = connection
+            self.process = process
+            self.failed_checks = 0
+            self.backoff = RESTART_BACKOFF
+
+    def is_enabled(self):
+        # Unmounting removes the auto mount setting, then nothing is restarted
+        return bool(aps.Settings(self.workspace_id).get("rclone-automount"))
+
+    def check(self):
+        with self.lock:
+            drive, connection, process = self.drive, self.connection, self.process
+
+        if process is not None and process.poll() is not None:
+            return False
+
+        if connection is not None:
+            start = time.monotonic()
+            try:
+                stats = connection.call("core/stats")
+                self.rc_latencies.append(time.monotonic() - start)
+                self.stats.append((stats.get("errors", 0), stats.get("transfers", 0)))
+            except Exception:
+                return False
+
+        mount_ok, latency = self.list_with_timeout(get_mount_path(drive))
+        if latency is not None:
+            self.latencies.append(latency)
+        return mount_ok
+
+    def list_with_timeout(self, path):
+        # A hanging mount blocks os.listdir forever, so it runs on its own
+        # thread. While that thread still hangs no other one is started
+        if self.probe is not None and self.probe.is_alive():
+            return False, None
+
+        result = {}
+
+        def run():
+            try:
+                os.listdir(path)
+                result["ok"] = True
+            except OSError:
+                result["ok"] = False
+
+        start = time.monotonic()
+        self.probe = threading.Thread(target=run, daemon=True)
+        self.probe.start()
+        self.probe.join(MOUNT_TIMEOUT)
+        return result.get("ok", False), time.monotonic() - start
+
+    def get_metrics(self):
+        latency = sum(self.latencies) / len(self.latencies) if self.latencies else None
+        rc_latency = (
+            sum(self.rc_latencies) / len(self.rc_latencies)
+            if self.rc_latencies
+            else None
+        )
+
+        # Errors per transfer over the window, the stats are counted since start
+        error_rate = None
+        if len(self.stats) > 1:
+            errors = self.stats[-1][0] - self.stats[0][0]
+            transfers = self.stats[-1][1] - self.stats[0][1]
+            if errors > 0 or transfers > 0:
+                error_rate = max(errors, 0) / max(errors + transfers, 1)
+
+        return {
+            "latency": latency,
+            "rc_latency": rc_latency,
+            "error_rate": error_rate,
+            "restarts": self.restarts,
+        }
+
+    def should_restart(self):
+        return not self.stopped.is_set() and self.is_enabled()
+
+    def stop_mount(self):
+        with self.lock:
+            drive, connection, process = self.drive, self.connection, self.process
+        unmount(drive, connection, process)
+
+    def run(self):
+        while not self.stopped.wait(CHECK_INTERVAL):
+            if not self.is_enabled():
+                break
+
+            if self.check():
+                self.failed_checks = 0
+                self.backoff = RESTART_BACKOFF
+                self.report()
+                continue
+
+            self.failed_checks += 1
+            if self.failed_checks < MAX_FAILED_CHECKS:
+                continue
+
+            print(f"Cloud Drive is not responding, mounting again in {self.backoff}s")
+            if self.stopped.wait(self.backoff) or not self.should_restart():
+                break
+            self.backoff = min(self.backoff * 2, MAX_RESTART_BACKOFF)
+            self.failed_checks = 0
+            self.restarts += 1
+
+            self.stop_mount()
+            # The drive letter or folder that the user mounted to is kept
+            drive = aps.Settings(self.workspace_id).get("rclone-drive") or self.drive
+            try:
+                self.restart(drive, self.workspace_id)
+            except Exception as e:
+                print(f"Cloud Drive could not be mounted again: {e}")
+
+        with _lock:
+            if _supervisors.get(self.workspace_id) is self:
+                del _supervisors[self.workspace_id]
+
+    def report(self):
+        # Warns once when the drive becomes slow or unreliable, not on every check
+        metrics = self.get_metrics()
+        slow = metrics["latency"] is not None and metrics["latency"] > SLOW_LATENCY
+        failing = (
+            metrics["error_rate"] is not None
+            and metrics["error_rate"] > HIGH_ERROR_RATE
+        )
+        if slow and "slow" not in self.warnings:
+            print(f"Cloud Drive responds slowly: {metrics['latency']:.1f}s")
+        if failing and "failing" not in self.warnings:
+            print(f"Cloud Drive transfers fail often: {metrics['error_rate']:.0%}")
+        self.warnings = {
+            name for name, active in (("slow", slow), ("failing", failing)) if active
+        }
+
+    def stop(self):
+        self.stopped.set()
+
+
+def supervise(workspace_id, drive, connection, process, restart):
+    # restart(drive, workspace_id) mounts the drive again
+    with _lock:
+        supervisor = _supervisors.get(workspace_id)
+        if supervisor is not None and supervisor.is_alive():
+            supervisor.update(drive, connection, process, restart)
+            return supervisor
+
+        supervisor = MountSupervisor(workspace_id, drive, connection, process, restart)
+        _supervisors[workspace_id] = supervisor
+        supervisor.start()
+        return supervisor
+
+
+def should_restart(workspace_id):
+    # Checked again right before mounting, the user may have unmounted the
+    # drive while the supervisor was waiting or loading the configuration
+    supervisor = get_supervisor(workspace_id)
+    return supervisor is not None and supervisor.should_restart()
+
+
+def get_supervisor(workspace_id):
+    with _lock:
+        return _supervisors.get(workspace_id)
+
+
+def stop_all():
+    with _lock:
+        supervisors = list(_supervisors.values())
+    for supervisor in supervisors:
+        supervisor.stop()
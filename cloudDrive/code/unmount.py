@@ -1,10 +1,18 @@
 import os
+import sys
 import platform
 import apsync as aps
 import anchorpoint as ap
 
 
+def stop_supervisor():
+    # An unmount on purpose must not be mounted again by the supervisor
+    if "rclone_supervisor_helper" in sys.modules:
+        sys.modules["rclone_supervisor_helper"].stop_all()
+
+
 def kill_rclone():
+    stop_supervisor()
     if platform.system() == "Windows":
         os.system("taskkill /IM rclone.exe /F")
     else:
@@ -1,21 +1,27 @@
-import platform
 import anchorpoint as ap
 import apsync as aps
 import os
 import ffmpeg_helper
-import subprocess
 
 ctx = ap.get_context()
 ui = ap.UI()
 
 input_path = ctx.path
 input_folder = ctx.folder
-input_filename = ctx.filename
-input_suffix = ctx.suffix
+input_paths = [
+    path
+    for path in (ctx.selected_files or [input_path])
+    if os.path.splitext(path)[1].lower() in (".mov", ".mp4", ".avi")
+] or [input_path]
 
 
-def get_newpath():
-    input_filename_no_version = input_filename
+def get_existing_names(folder):
+    return {name.lower() for name in os.listdir(folder)}
+
+
+def get_newpath(path=input_path, existing_names=None):
+    input_filename_no_version, input_suffix = os.path.splitext(os.path.basename(path))
+    input_suffix = input_suffix[1:]
     version_string = ""
 
     for c in reversed(input_filename_no_version):
@@ -44,18 +50,36 @@ def get_newpath():
     else:
         number_of_version_digits = 3
 
+    # Check against one listing of the folder instead of probing every version
+    folder = os.path.dirname(path)
+    if existing_names is None:
+        existing_names = get_existing_names(folder)
+
     while True:
-        new_path = os.path.join(
-            input_folder,
-            f"{input_filename_no_version}_v{str(version).zfill(number_of_version_digits)}.{input_suffix}",
-        )
-        if not os.path.exists(new_path):
-            return new_path
+        new_filename = f"{input_filename_no_version}_v{str(version).zfill(number_of_version_digits)}.{input_suffix}"
+        if new_filename.lower() not in existing_names:
+            # Reserve the name, so that a batch does not create it twice
+            existing_names.add(new_filename.lower())
+            return os.path.join(folder, new_filename)
         else:
             version = version + 1
 
 
+def get_newpaths(paths):
+    listings = {}
+    new_paths = []
+    for path in paths:
+        folder = os.path.dirname(path)
+        if folder not in listings:
+            listings[folder] = get_existing_names(folder)
+        new_paths.append(get_newpath(path, listings[folder]))
+    return new_paths
+
+
 def get_filename_text():
+    if len(input_paths) > 1:
+        return f"This will create <b>{len(input_paths)}</b> new files"
+
     new_path = get_newpath()
     new_filename = os.path.basename(new_path)
     return f"This will create a new file: <b>{new_filename}</b>"
@@ -70,79 +94,114 @@ def update_dialog(dialog: ap.Dialog, value=None):
     dialog.set_value("filename", get_filename_text())
 
 
-def run_ffmpeg(arguments, remove_audio):
-    ui.show_busy(input_path)
-    platform_args = {}
-    if platform.system() == "Windows":
-        from subprocess import CREATE_NO_WINDOW
+def build_arguments(ffmpeg_path, video_path, new_path, remove_audio, audio, longest):
+    if remove_audio:
+        return [
+            ffmpeg_path,
+            "-i",
+            video_path,
+            "-c",
+            "copy",
+            "-map",
+            "0:v:0",
+            new_path,
+        ]
+
+    audio_streams = ffmpeg_helper.probe_streams(ffmpeg_path, audio)["audio"]
+    if not audio_streams:
+        raise ValueError(f"{audio} has no audio stream")
+
+    arguments = [
+        ffmpeg_path,
+        "-i",
+        video_path,
+        "-i",
+        audio,
+        "-map",
+        "0:v:0",
+        "-map",
+        "1:a:0",
+    ]
+
+    # Only re-encode the audio if the container cannot store it as it is
+    container = os.path.splitext(new_path)[1][1:]
+    if ffmpeg_helper.fits_container(audio_streams[0], container):
+        arguments.extend(["-c", "copy"])
+    else:
+        arguments.extend(["-c:v", "copy", "-c:a", "aac"])
+
+    if not longest:
+        arguments.append("-shortest")
+
+    arguments.append(new_path)
+    return arguments
+
 
-        platform_args = {"creationflags": CREATE_NO_WINDOW}
+def run_ffmpeg(remove_audio, audio, longest):
+    for path in input_paths:
+        ui.show_busy(path)
 
+    failed = 0
     try:
-        subprocess.check_call(arguments, **platform_args)
+        ffmpeg_path = ffmpeg_helper.get_ffmpeg_fullpath()
+        new_paths = get_newpaths(input_paths)
+
+        # All remuxes go through the shared queue, which bounds the number of
+        # FFmpeg processes and shows one progress for the whole batch.
+        # Remuxing is cheap, so it may skip ahead of queued video conversions
+        queue = ffmpeg_helper.get_job_queue()
+        jobs = []
+        for path, new_path in zip(input_paths, new_paths):
+            arguments = build_arguments(
+                ffmpeg_path, path, new_path, remove_audio, audio, longest
+            )
+            jobs.append(
+                queue.submit(
+                    arguments,
+                    os.path.basename(new_path),
+                    priority=ffmpeg_helper.PRIORITY_HIGH,
+                    target=new_path,
+                )
+            )
+
+        for job in jobs:
+            job.wait()
+            if not job.succeeded():
+                failed += 1
+                print(job.output)
+
+        if any(job.canceled for job in jobs):
+            ui.show_info("Canceled")
+            return
+        if failed > 0:
+            raise RuntimeError(f"{failed} of {len(jobs)} conversions failed")
+
+        description = f"{len(jobs)} videos" if len(jobs) > 1 else ""
         if remove_audio:
-            ui.show_success("Audio Removed")
+            ui.show_success("Audio Removed", description)
         else:
-            ui.show_success("Audio Changed")
+            ui.show_success("Audio Changed", description)
     except Exception:
+        description = f"{failed} of {len(input_paths)} videos failed" if failed else ""
         if remove_audio:
-            ui.show_error("Could not remove audio")
+            ui.show_error("Could not remove audio", description)
         else:
             ui.show_error(
                 "Could not change audio",
-                "Make sure you have selected a valid audio file",
+                description or "Make sure you have selected a valid audio file",
             )
     finally:
-        ui.finish_busy(input_path)
+        for path in input_paths:
+            ui.finish_busy(path)
 
 
 def convert(dialog: ap.Dialog):
     remove_audio = dialog.get_value("remove")
     longest = dialog.get_value("longest")
     audio = dialog.get_value("newaudioinput")
-    ffmpeg_path = ffmpeg_helper.get_ffmpeg_fullpath()
-    new_path = get_newpath()
-
-    if remove_audio:
-        arguments = [
-            ffmpeg_path,
-            "-i",
-            input_path,
-            "-c",
-            "copy",
-            "-map",
-            "0:v:0",
-            new_path,
-        ]
-    else:
-        arguments = [
-            ffmpeg_path,
-            "-i",
-            input_path,
-            "-i",
-            audio,
-            "-map",
-            "0:v:0",
-            "-map",
-            "1:a:0",
-        ]
-
-        if input_suffix == "mp4":
-            arguments.append("-c:v")
-            arguments.append("copy")
-            arguments.append("-c:a")
-            arguments.append("aac")
-        else:
-            arguments.append("-c")
-            arguments.append("copy")
-
-        if not longest:
-            arguments.append("-shortest")
-
-        arguments.append(new_path)
 
     dialog.close()
-    ctx.run_async(run_ffmpeg, arguments, remove_audio)
+    ctx.run_async(run_ffmpeg, remove_audio, audio, longest)
 
 
 def create_dialog():
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import time
+
+import ffmpeg_helper
+
+# Long sequences are encoded in chunks of this many frames
+CHUNK_FRAMES = 250
+
+# Encoded chunks are evicted (least recently used first) above this size
+MAX_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+
+# Chunks that are still being encoded end with .part, the ones that are older
+# than this were left behind by a crash
+MAX_PART_AGE = 24 * 60 * 60
+
+# Records of converted videos are removed when they have not been used for this
+# long, or above this count (least recently used first)
+MAX_OUTPUT_AGE = 90 * 24 * 60 * 60
+MAX_OUTPUT_RECORDS = 2000
+
+
+def get_cache_dir():
+    cache_dir = os.path.join(ffmpeg_helper._get_ffmpeg_dir(), "cache")
+    os.makedirs(os.path.join(cache_dir, "segments"), exist_ok=True)
+    os.makedirs(os.path.join(cache_dir, "outputs"), exist_ok=True)
+    return cache_dir
+
+
+def fingerprint_files(files):
+    # Only looks at the file metadata, so that thousands of frames can be
+    # checked without reading them
+    fingerprint = hashlib.sha1()
+    for file in files:
+        stat = os.stat(file)
+        fingerprint.update(
+            f"{os.path.normcase(file)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode(
+                "utf-8"
+            )
+        )
+    return fingerprint.hexdigest()
+
+
+def get_key(files, settings):
+    key = hashlib.sha1(fingerprint_files(files).encode("utf-8"))
+    key.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return key.hexdigest()
+
+
+def get_segment_path(key):
+    return os.path.join(get_cache_dir(), "segments", f"{key}.mp4")
+
+
+def has_segment(key):
+    segment = get_segment_path(key)
+    if not os.path.isfile(segment):
+        return False
+
+    # Mark the segment as recently used
+    os.utime(segment)
+    return True
+
+
+def _get_output_record(key):
+    return os.path.join(get_cache_dir(), "outputs", f"{key}.json")
+
+
+def is_output_current(key, output_path):
+    # True if output_path has been created from the same inputs and settings
+    # and has not been modified since
+    try:
+        with open(_get_output_record(key), "r", encoding="utf-8") as file:
+            record = json.load(file)
+        stat = os.stat(output_path)
+    except (OSError, ValueError):
+        return False
+
+    current = (
+        record["path"] == os.path.normcase(os.path.abspath(output_path))
+        and record["size"] == stat.st_size
+        and record["mtime"] == stat.st_mtime_ns
+    )
+    if current:
+        # Mark the record as recently used
+        try:
+            os.utime(_get_output_record(key))
+        except OSError:
+            pass
+    return current
+
+
+def store_output(key, output_path):
+    try:
+        stat = os.stat(output_path)
+        with open(_get_output_record(key), "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "path": os.path.normcase(os.path.abspath(output_path)),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime_ns,
+                },
+                file,
+            )
+    except OSError as e:
+        print(f"Could not cache {output_path}: {e}")
+
+    trim()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def trim_outputs(max_records=MAX_OUTPUT_RECORDS, max_age=MAX_OUTPUT_AGE):
+    outputs_dir = os.path.join(get_cache_dir(), "outputs")
+    records = []
+    now = time.time()
+    for entry in os.scandir(outputs_dir):
+        if not entry.is_file():
+            continue
+        mtime = entry.stat().st_mtime
+        if now - mtime > max_age:
+            _remove(entry.path)
+        else:
+            records.append((mtime, entry.path))
+
+    records.sort(reverse=True)
+    for _, path in records[max_records:]:
+        _remove(path)
+
+
+def trim(max_size=MAX_CACHE_SIZE):
+    trim_outputs()
+
+    segments_dir = os.path.join(get_cache_dir(), "segments")
+    segments = []
+    total_size = 0
+    now = time.time()
+    for entry in os.scandir(segments_dir):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        if entry.name.endswith(".part"):
+            if now - stat.st_mtime > MAX_PART_AGE:
+                _remove(entry.path)
+            continue
+        segments.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size += stat.st_size
+
+    for _, size, path in sorted(segments):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
@@ -2,20 +2,86 @@ import platform
 import os
 import requests
 import zipfile
-import io
+import hashlib
 import shutil
 import stat
+import subprocess
+import threading
+import heapq
+import itertools
+import json
+import re
+import time
 import anchorpoint as ap
 
 if platform.system() == "Darwin":
     FFMPEG_INSTALL_URL = "https://s3.eu-central-1.amazonaws.com/releases.anchorpoint.app/ffmpeg/ffmpeg.zip"
     FFMPEG_ZIP_PATH = "ffmpeg/ffmpeg"
+    FFMPEG_CHECKSUM_URL = None
 else:
     FFMPEG_INSTALL_URL = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
     FFMPEG_ZIP_PATH = "ffmpeg-master-latest-win64-gpl/bin/ffmpeg.exe"
+    FFMPEG_CHECKSUM_URL = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/checksums.sha256"
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 ffmpeg_folder_path = "~/Documents/Anchorpoint/actions/ffmpeg"
 
+# Jobs with a lower number are started first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# FFmpeg already encodes on multiple threads, so only a few processes should
+# run side by side before they start to fight for the CPU
+MAX_CONCURRENT_JOBS = max(1, (os.cpu_count() or 1) // 4)
+
+# libx264 settings for the quality options of the conversion settings
+ENCODE_TIERS = {
+    "Preview (fast)": {
+        "preset": "veryfast",
+        "crf": 28,
+        "tune": "fastdecode",
+        "pix_fmt": "yuv420p",
+    },
+    "Review": {
+        "preset": "medium",
+        "crf": 20,
+        "tune": "film",
+        "pix_fmt": "yuv420p",
+    },
+    # High quality, but still 4:2:0 so that QuickTime and browsers can play it
+    "Archive": {
+        "preset": "slow",
+        "crf": 14,
+        "tune": "film",
+        "pix_fmt": "yuv420p",
+    },
+}
+DEFAULT_ENCODE_TIER = "Review"
+
+# Audio codecs that can be stored in a container without re-encoding
+CONTAINER_AUDIO_CODECS = {
+    "mp4": {"aac", "mp3", "alac", "ac3", "eac3", "opus", "flac"},
+    "m4v": {"aac", "mp3", "alac", "ac3", "eac3"},
+    "mov": {
+        "aac",
+        "mp3",
+        "alac",
+        "ac3",
+        "pcm_s16le",
+        "pcm_s24le",
+        "pcm_s32le",
+        "pcm_f32le",
+        "pcm_s16be",
+        "pcm_s24be",
+    },
+    "avi": {"mp3", "ac3", "pcm_u8", "pcm_s16le", "pcm_s24le"},
+}
+
+STREAM_PATTERN = re.compile(r"Stream #\d+:\d+.*?: (Video|Audio): (\w+)")
+MAX_PROBE_CACHE_ENTRIES = 2000
+
 
 def _get_ffmpeg_dir():
     dir = os.path.expanduser(ffmpeg_folder_path)
@@ -31,9 +97,181 @@ def get_ffmpeg_fullpath():
     return os.path.normpath(dir)
 
 
+def _get_download_path():
+    return os.path.join(_get_ffmpeg_dir(), "ffmpeg_download.zip")
+
+
+def _hash_file(path):
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_expected_sha256(checksum_url, filename):
+    # Reads a "<sha256>  <filename>" checksum list as published with the builds
+    if not checksum_url:
+        return None
+    try:
+        r = requests.get(checksum_url, timeout=30)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Could not load FFmpeg checksums: {e}")
+        return None
+
+    for line in r.text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("*") == filename:
+            return parts[0].lower()
+    return None
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _read_validator(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def download_file(url, target_path, expected_sha256=None, progress=None):
+    # Streams url to a .part file next to target_path. An interrupted download
+    # is resumed with a HTTP Range request the next time, but only if the
+    # file on the server is still the same (If-Range with the ETag)
+    part_path = target_path + ".part"
+    validator_path = part_path + ".json"
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    validator = _read_validator(validator_path) if offset else None
+    if not validator or validator.get("url") != url or not validator.get("value"):
+        # Without a validator a resumed download could mix two versions
+        offset = 0
+    headers = (
+        {"Range": f"bytes={offset}-", "If-Range": validator["value"]} if offset else {}
+    )
+
+    with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+        if offset and r.status_code == 416:
+            # The .part file does not fit the file on the server anymore
+            _remove_files(part_path, validator_path)
+            return download_file(url, target_path, expected_sha256, progress)
+        r.raise_for_status()
+
+        # The file has changed on the server or the server ignores the Range
+        # header, both send the whole file again
+        if r.status_code != 206:
+            offset = 0
+            value = r.headers.get("ETag") or r.headers.get("Last-Modified")
+            # A weak ETag cannot be used for If-Range
+            if value and value.startswith("W/"):
+                value = r.headers.get("Last-Modified")
+            with open(validator_path, "w", encoding="utf-8") as file:
+                json.dump({"url": url, "value": value}, file)
+
+        file_hash = hashlib.sha256()
+        if offset:
+            with open(part_path, "rb") as part:
+                for chunk in iter(lambda: part.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    file_hash.update(chunk)
+
+        total_size = offset + int(r.headers.get("Content-Length", 0))
+        downloaded = offset
+        with open(part_path, "ab" if offset else "wb") as file:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+                file_hash.update(chunk)
+                downloaded += len(chunk)
+                if progress and total_size > 0:
+                    progress.report_progress(downloaded / total_size)
+                    progress.set_text(
+                        f"Downloading {downloaded // (1024 * 1024)} of {total_size // (1024 * 1024)} MB"
+                    )
+
+    digest = file_hash.hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        _remove_files(part_path, validator_path)
+        raise ValueError(f"Checksum mismatch for {os.path.basename(url)}")
+
+    os.replace(part_path, target_path)
+    _remove_files(validator_path)
+    return digest
+
+
+def extract_member(zip_path, member, target_path):
+    # Only the requested member is decompressed, straight from the file on disk
+    part_path = target_path + ".part"
+    with zipfile.ZipFile(zip_path) as z:
+        with z.open(member) as source:
+            with open(part_path, "wb") as target:
+                shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+    os.replace(part_path, target_path)
+
+
+def install_ffmpeg(url, member, checksum_url=None, progress=None):
+    download_path = _get_download_path()
+    expected_sha256 = get_expected_sha256(
+        checksum_url, os.path.basename(url)
+    )
+
+    # A previously downloaded archive is kept as a local cache
+    cache_info_path = download_path + ".json"
+    cached = False
+    try:
+        with open(cache_info_path, "r", encoding="utf-8") as file:
+            cache_info = json.load(file)
+        cached = (
+            cache_info["url"] == url
+            and (expected_sha256 is None or cache_info["sha256"] == expected_sha256)
+            and _hash_file(download_path) == cache_info["sha256"]
+        )
+    except (OSError, ValueError, KeyError):
+        cached = False
+
+    if cached:
+        digest = cache_info["sha256"]
+    else:
+        # The record is only written after a successful extraction
+        _remove_files(cache_info_path)
+        try:
+            digest = download_file(url, download_path, expected_sha256, progress)
+        except ValueError:
+            _remove_files(download_path)
+            raise
+
+    if progress:
+        progress.set_text("Extracting")
+    try:
+        extract_member(download_path, member, get_ffmpeg_fullpath())
+    except (zipfile.BadZipFile, KeyError):
+        # A broken archive must not be used again, the next install downloads it
+        _remove_files(
+            download_path,
+            download_path + ".part",
+            download_path + ".part.json",
+            cache_info_path,
+        )
+        raise ValueError("The FFmpeg download is damaged, please install again")
+
+    with open(cache_info_path, "w", encoding="utf-8") as file:
+        json.dump({"url": url, "sha256": digest}, file)
+
+    if platform.system() == "Darwin":
+        os.chmod(get_ffmpeg_fullpath(), stat.S_IRWXU)
+
+
 def _install_ffmpeg_async(callback, *args, **kwargs):
     ctx = ap.get_context()
     ffmpeg_dir = _get_ffmpeg_dir()
+    progress = None
 
     try:
         # Log directory path
@@ -48,25 +286,18 @@ def _install_ffmpeg_async(callback, *args, **kwargs):
             raise FileNotFoundError(
                 f"Failed to create directory: {ffmpeg_dir}")
 
-        # download zip
-        progress = ap.Progress("Installing FFmpeg", infinite=True)
-        r = requests.get(FFMPEG_INSTALL_URL)
-
-        # open zip file and extract ffmpeg.exe to the right folder
-        z = zipfile.ZipFile(io.BytesIO(r.content))
-
-        with z.open(FFMPEG_ZIP_PATH) as source:
-            with open(get_ffmpeg_fullpath(), "wb") as target:
-                shutil.copyfileobj(source, target)
-
-        if platform.system() == "Darwin":
-            os.chmod(get_ffmpeg_fullpath(), stat.S_IRWXU)
+        # download zip and extract ffmpeg.exe to the right folder
+        progress = ap.Progress("Installing FFmpeg", infinite=False)
+        install_ffmpeg(
+            FFMPEG_INSTALL_URL, FFMPEG_ZIP_PATH, FFMPEG_CHECKSUM_URL, progress
+        )
 
         progress.finish()
         ctx.run_async(callback, *args, **kwargs)
     except Exception as e:
         ap.UI().show_error("FFmpeg Installation Error", str(e))
-        progress.finish()
+        if progress:
+            progress.finish()
 
 
 def _install_ffmpeg(dialog, callback, *args, **kwargs):
@@ -100,3 +331,462 @@ def guarantee_ffmpeg(callback, *args, **kwargs):
     else:
         ctx.run_async(callback, *args, **kwargs)
 
+
+def encoder_arguments(tier_name):
+    # The thread count is set by the job queue, depending on how many jobs run
+    tier = ENCODE_TIERS.get(tier_name, ENCODE_TIERS[DEFAULT_ENCODE_TIER])
+    return [
+        "-c:v", "libx264",
+        "-preset", tier["preset"],
+        "-crf", str(tier["crf"]),
+        "-tune", tier["tune"],
+        "-pix_fmt", tier["pix_fmt"],
+    ]
+
+
+def benchmark_encode_tiers(ffmpeg_path, frames=100, size="1920x1080"):
+    # Encodes a generated test clip with every tier and measures frames/sec
+    results = {}
+    for tier_name in ENCODE_TIERS.keys():
+        arguments = [
+            ffmpeg_path,
+            "-hide_banner",
+            "-f", "lavfi",
+            "-i", f"testsrc2=size={size}:rate=25",
+            "-frames:v", str(frames),
+        ]
+        arguments += encoder_arguments(tier_name)
+        arguments += ["-f", "null", "-"]
+
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(
+                arguments,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                encoding="utf-8",
+                errors="replace",
+                **_get_platform_args(),
+            )
+        except OSError as e:
+            print(f"Could not run FFmpeg: {e}")
+            return results
+        duration = time.perf_counter() - start
+        if result.returncode == 0 and duration > 0:
+            results[tier_name] = frames / duration
+        else:
+            # Shown in the console, the settings point the user to it
+            print(f"Benchmark of {tier_name} failed:")
+            print(result.stderr)
+    return results
+
+
+def _get_probe_cache_file():
+    return os.path.join(_get_ffmpeg_dir(), "probe_cache.json")
+
+
+_probe_cache = None
+_probe_cache_lock = threading.Lock()
+
+
+def _load_probe_cache():
+    global _probe_cache
+    if _probe_cache is None:
+        try:
+            with open(_get_probe_cache_file(), "r", encoding="utf-8") as file:
+                _probe_cache = json.load(file)
+        except (OSError, ValueError):
+            _probe_cache = {}
+    return _probe_cache
+
+
+def _store_probe_cache():
+    # Keep the most recent entries only
+    while len(_probe_cache) > MAX_PROBE_CACHE_ENTRIES:
+        del _probe_cache[next(iter(_probe_cache))]
+    try:
+        with open(_get_probe_cache_file(), "w", encoding="utf-8") as file:
+            json.dump(_probe_cache, file)
+    except OSError as e:
+        print(f"Could not store FFmpeg probe cache: {e}")
+
+
+def probe_streams(ffmpeg_path, path):
+    # Returns the codecs of all video and audio streams, e.g.
+    # {"video": ["h264"], "audio": ["aac"]}. Results are cached per file
+    # fingerprint, so probing the same unchanged file again is free.
+    # FFmpeg is used instead of ffprobe, because only FFmpeg is installed.
+    stat = os.stat(path)
+    key = f"{os.path.normcase(os.path.abspath(path))}|{stat.st_size}|{stat.st_mtime_ns}"
+    with _probe_cache_lock:
+        cache = _load_probe_cache()
+        if key in cache:
+            return cache[key]
+
+    result = subprocess.run(
+        [ffmpeg_path, "-hide_banner", "-i", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        encoding="utf-8",
+        errors="replace",
+        **_get_platform_args(),
+    )
+
+    streams = {"video": [], "audio": []}
+    for stream_type, codec in STREAM_PATTERN.findall(result.stderr):
+        streams[stream_type.lower()].append(codec)
+
+    with _probe_cache_lock:
+        cache = _load_probe_cache()
+        cache[key] = streams
+        _store_probe_cache()
+    return streams
+
+
+def fits_container(audio_codec, container):
+    # Unknown containers keep the previous behavior and copy all streams
+    codecs = CONTAINER_AUDIO_CODECS.get(container.lower())
+    return codecs is None or audio_codec in codecs
+
+
+def _get_jobs_file():
+    return os.path.join(_get_ffmpeg_dir(), "jobs.json")
+
+
+def _get_platform_args():
+    if platform.system() == "Windows":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return {"startupinfo": startupinfo}
+    return {}
+
+
+class FFmpegJob:
+    def __init__(
+        self,
+        arguments,
+        description,
+        key=None,
+        priority=PRIORITY_NORMAL,
+        total_frames=0,
+        cleanup=None,
+        target=None,
+    ):
+        self.arguments = [str(argument) for argument in arguments]
+        self.description = description
+        self.key = key if key else json.dumps(self.arguments)
+        self.priority = priority
+        self.total_frames = total_frames
+        self.cleanup = cleanup if cleanup else []
+        # The file that the user gets, jobs without one only produce an
+        # intermediate result for the action that submitted them
+        self.target = target
+
+        self.progress = 0.0
+        self.output = ""
+        self.returncode = None
+        self.canceled = False
+        self.process = None
+        self._done = threading.Event()
+
+    def to_json(self):
+        return {
+            "arguments": self.arguments,
+            "description": self.description,
+            "key": self.key,
+            "priority": self.priority,
+            "total_frames": self.total_frames,
+            "cleanup": self.cleanup,
+            "target": self.target,
+        }
+
+    def inputs_exist(self):
+        for index, argument in enumerate(self.arguments[:-1]):
+            if argument != "-i":
+                continue
+            path = self.arguments[index + 1]
+            # image2 patterns such as shot_%04d.exr cannot be checked directly
+            if "%" not in path and not os.path.exists(path):
+                return False
+        return True
+
+    def run(self, on_progress, threads=None):
+        arguments = self.arguments
+        if threads:
+            # Applies to the output, which is always the last argument
+            arguments = arguments[:-1] + ["-threads", str(threads), arguments[-1]]
+
+        self.process = subprocess.Popen(
+            args=arguments,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.PIPE,
+            bufsize=1,
+            universal_newlines=True,
+            encoding="utf-8",
+            **_get_platform_args(),
+        )
+
+        drop_frame = 0
+        output = []
+        for line in self.process.stderr:
+            output.append(line if line.endswith("\n") else line + "\n")
+
+            if "drop_frames=" in line:
+                drop_frame = int(re.search(r"(\d+)", line).group())
+
+            if "frame=" in line and self.total_frames > 0:
+                current_frame = int(re.search(r"(\d+)", line).group())
+                self.progress = min(
+                    1.0, (current_frame + drop_frame) / self.total_frames
+                )
+                on_progress()
+
+        self.process.wait()
+        self.output = "".join(output)
+        self.returncode = self.process.returncode
+        self.progress = 1.0
+
+    def terminate(self):
+        self.canceled = True
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def finish(self):
+        for path in self.cleanup:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def succeeded(self):
+        return not self.canceled and self.returncode == 0
+
+
+class FFmpegJobQueue:
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+        self._pending = []
+        self._running = []
+        self._batch = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._workers = 0
+        self._progress = None
+        self._last_report = 0
+
+    def submit(
+        self,
+        arguments,
+        description,
+        key=None,
+        priority=PRIORITY_NORMAL,
+        total_frames=0,
+        cleanup=None,
+        target=None,
+    ):
+        job = FFmpegJob(
+            arguments, description, key, priority, total_frames, cleanup, target
+        )
+        with self._lock:
+            # Identical jobs are only executed once, all callers wait for the same result
+            existing = self._jobs.get(job.key)
+            if existing:
+                existing.priority = min(existing.priority, priority)
+                job.finish()
+                return existing
+
+            self._add(job)
+            self._store()
+        return job
+
+    def resume(self):
+        # Picks up jobs that were still pending when Anchorpoint was closed.
+        # Jobs without a target were part of a conversion that nobody waits
+        # for anymore, so they are dropped
+        try:
+            with open(_get_jobs_file(), "r", encoding="utf-8") as file:
+                stored_jobs = json.load(file)
+        except (OSError, ValueError):
+            return []
+
+        resumed = []
+        with self._lock:
+            for stored_job in stored_jobs:
+                job = FFmpegJob(**stored_job)
+                if job.key in self._jobs:
+                    continue
+                if not job.target or not job.inputs_exist():
+                    job.finish()
+                    continue
+                self._add(job)
+                resumed.append(job)
+            self._store()
+        return resumed
+
+    def cancel(self):
+        with self._lock:
+            for _, _, job in self._pending:
+                job.canceled = True
+                job.finish()
+                self._jobs.pop(job.key, None)
+            self._pending = []
+            for job in self._running:
+                job.terminate()
+            self._store()
+
+    def _add(self, job):
+        self._jobs[job.key] = job
+        self._batch.append(job)
+        heapq.heappush(self._pending, (job.priority, next(self._counter), job))
+
+        if self._progress is None:
+            self._progress = ap.Progress(
+                "Video Conversion", "Waiting...", infinite=False, cancelable=True
+            )
+        self._report_progress(force=True)
+
+        if self._workers < self.max_workers:
+            self._workers += 1
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _next_job(self):
+        with self._lock:
+            if not self._pending:
+                self._workers -= 1
+                if self._workers == 0:
+                    self._finish_progress()
+                return None
+
+            # Priorities might have been raised by a duplicate submission
+            heapq.heapify(self._pending)
+            _, _, job = heapq.heappop(self._pending)
+            self._running.append(job)
+            self._store()
+
+            # A job that runs alone lets FFmpeg use all cores, otherwise the
+            # cores are shared between the jobs that run side by side
+            jobs = min(self.max_workers, len(self._running) + len(self._pending))
+            threads = max(1, (os.cpu_count() or 1) // jobs) if jobs > 1 else None
+            return job, threads
+
+    def _work(self):
+        while True:
+            next_job = self._next_job()
+            if next_job is None:
+                return
+
+            job, threads = next_job
+            try:
+                job.run(self._report_progress, threads)
+            except Exception as e:
+                job.output += str(e)
+                job.returncode = -1
+            finally:
+                with self._lock:
+                    self._running.remove(job)
+                    self._jobs.pop(job.key, None)
+                    self._store()
+                job.finish()
+                self._report_progress(force=True)
+
+    def _report_progress(self, force=False):
+        progress = self._progress
+        if progress is None:
+            return
+
+        if progress.canceled:
+            self.cancel()
+            return
+
+        # Many jobs report every frame, the UI only needs a few updates per second
+        now = time.monotonic()
+        if not force and now - self._last_report < 0.25:
+            return
+        self._last_report = now
+
+        batch = list(self._batch)
+        if not batch:
+            return
+
+        total = len(batch)
+        done = len([job for job in batch if job.is_done()])
+        percentage = sum(job.progress for job in batch) / total
+        progress.report_progress(percentage)
+        if total > 1:
+            progress.set_text(f"{done} of {total} done, {int(percentage * 100)}%")
+        elif batch[0].total_frames > 0:
+            progress.set_text(f"{int(percentage * 100)}% encoded")
+        else:
+            progress.set_text(f"Converting {batch[0].description}")
+
+    def _finish_progress(self):
+        if self._progress:
+            self._progress.finish()
+        self._progress = None
+        self._batch = []
+
+    def _store(self):
+        jobs = [job for _, _, job in sorted(self._pending)] + self._running
+        try:
+            if jobs:
+                with open(_get_jobs_file(), "w", encoding="utf-8") as file:
+                    json.dump([job.to_json() for job in jobs], file)
+            elif os.path.exists(_get_jobs_file()):
+                os.remove(_get_jobs_file())
+        except OSError as e:
+            print(f"Could not store FFmpeg jobs: {e}")
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = FFmpegJobQueue()
+        return _job_queue
+
+
+def resume_jobs():
+    # Runs the conversions that were interrupted by closing Anchorpoint and
+    # reports them like the action that started them
+    if not os.path.isfile(get_ffmpeg_fullpath()):
+        return
+
+    jobs = get_job_queue().resume()
+    if not jobs:
+        return
+
+    for job in jobs:
+        job.wait()
+
+    if any(job.canceled for job in jobs):
+        ap.UI().show_info("Canceled")
+        return
+
+    failed = [job for job in jobs if not job.succeeded()]
+    for job in failed:
+        print(job.output)
+
+    names = ", ".join(os.path.basename(job.target) for job in jobs)
+    if failed:
+        ap.UI().show_error(
+            f"{len(failed)} of {len(jobs)} resumed conversions failed",
+            "Check Anchorpoint Console",
+        )
+    else:
+        ap.UI().show_success("Export Successful", f"Created {names}")
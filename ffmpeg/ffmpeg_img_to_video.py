@@ -1,24 +1,116 @@
 import re
 import anchorpoint as ap
 import apsync as aps
-import subprocess
 import os
 import random
 import string
 import mimetypes
-import platform
 import tempfile
 
 import ffmpeg_helper
+import ffmpeg_cache
 
 ui = ap.UI()
 ctx = ap.get_context()
 
+# Splits "shot_0010.exr" into "shot_", "0010" and ".exr"
+FRAME_PATTERN = re.compile(r"^(.*?)(\d+)(\.[^.]+)?$")
+# Only images can be read as an image2 sequence, numbered videos such as
+# clip1.mov and clip2.mov are concatenated instead
+SEQUENCE_EXTENSIONS = (".png", ".exr", ".jpg", ".jpeg", ".tif", ".tiff")
+
 
 def create_random_text():
     ran = "".join(random.choices(string.ascii_uppercase + string.digits, k=10))
     return str(ran)
 
+
+def natural_sort_key(path):
+    # Sort "shot_2.png" before "shot_10.png", regardless of the digit padding
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", path)
+    ]
+
+
+def detect_sequences(selected_files):
+    # Group files into numbered sequences, e.g. shot_0001.exr ... shot_0100.exr
+    # Files without a frame number end up in a sequence of their own
+    sequences = {}
+    for selected_file in selected_files:
+        folder, name = os.path.split(selected_file)
+        match = FRAME_PATTERN.match(name)
+        if match and name.lower().endswith(SEQUENCE_EXTENSIONS):
+            prefix, number, suffix = match.groups()
+            suffix = suffix or ""
+        else:
+            prefix, number, suffix = name, None, ""
+
+        key = (folder, prefix, suffix)
+        if key not in sequences:
+            sequences[key] = {
+                "folder": folder,
+                "prefix": prefix,
+                "suffix": suffix,
+                "frames": [],
+                "files": [],
+                "digits": set(),
+            }
+        sequence = sequences[key]
+        sequence["files"].append(selected_file)
+        if number is not None:
+            sequence["frames"].append(int(number))
+            sequence["digits"].add(number)
+
+    result = []
+    for sequence in sorted(
+        sequences.values(), key=lambda s: natural_sort_key(s["files"][0])
+    ):
+        sequence["files"].sort(key=natural_sort_key)
+        sequence["frames"].sort()
+        sequence["gaps"] = find_gaps(sequence["frames"])
+        sequence["padding"] = get_padding(sequence["digits"])
+        del sequence["digits"]
+        result.append(sequence)
+    return result
+
+
+def find_gaps(frames):
+    gaps = []
+    for previous, current in zip(frames, frames[1:]):
+        if current - previous > 1:
+            gaps.extend(range(previous + 1, current))
+    return gaps
+
+
+def get_padding(digits):
+    # Returns the zero padding of the frame numbers, 0 for unpadded numbers
+    # and None if the sequence mixes different paddings (e.g. 0001 and 01)
+    lengths = {len(number) for number in digits}
+    if len(lengths) == 1:
+        return lengths.pop()
+    if any(number.startswith("0") for number in digits):
+        return None
+    return 0
+
+
+def sequence_pattern(sequence):
+    # Returns an image2 pattern (e.g. shot_%04d.exr) for sequences that ffmpeg
+    # can read directly, or None if the concat demuxer has to be used instead
+    frames = sequence["frames"]
+    if len(frames) != len(sequence["files"]) or len(frames) < 2:
+        return None
+    if sequence["gaps"] or len(set(frames)) != len(frames):
+        return None
+    if sequence["padding"] is None:
+        return None
+
+    number = f"%0{sequence['padding']}d" if sequence["padding"] else "%d"
+    prefix = sequence["prefix"].replace("%", "%%")
+    suffix = sequence["suffix"].replace("%", "%%")
+    return os.path.join(sequence["folder"], f"{prefix}{number}{suffix}")
+
+
 def concat_demuxer(selected_files, fps):
     # Create a temporary file for ffmpeg
     temp_dir = tempfile.gettempdir()
@@ -32,7 +124,115 @@ def concat_demuxer(selected_files, fps):
 
     return output
 
-def ffmpeg_seq_to_video(ffmpeg_path, target_folder, fps, selected_files, scale, audio_path=None):
+
+def input_arguments(selected_files, fps, is_exr):
+    # Contiguous image sequences are passed to FFmpeg as a pattern, everything
+    # else (gaps, mixed sequences, videos) goes through the concat demuxer
+    pattern = None
+    sequences = detect_sequences(selected_files)
+    if len(sequences) == 1:
+        pattern = sequence_pattern(sequences[0])
+
+    arguments = ["-apply_trc", "iec61966_2_1"] if is_exr else []
+    concat_file = None
+    if pattern:
+        arguments.extend([
+            "-framerate", fps,
+            "-y",
+            "-f", "image2",
+            "-start_number", str(sequences[0]["frames"][0]),
+            "-i", pattern,
+        ])
+    else:
+        concat_file = concat_demuxer(selected_files, fps)
+        arguments.extend([
+            "-r", fps,
+            "-y",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", concat_file,
+        ])
+
+    return arguments, concat_file
+
+
+def encode_arguments(scale, encode_tier):
+    return [
+        "-hide_banner",
+        "-fps_mode", "vfr",
+        *ffmpeg_helper.encoder_arguments(encode_tier),
+        "-vf", scale + ",pad=ceil(iw/2)*2:ceil(ih/2)*2",
+    ]
+
+
+def show_job_error(job, audio_path):
+    output = job.output
+    if audio_path and "Error opening input file" in output and audio_path in output:
+        print(output)
+        ui.show_error("Unsupported Audio File", description="The specified audio file could not be opened. Please check the file path and format.")
+    elif "Error opening input files: Invalid data found when processing input" in output:
+        ui.show_error("Unsupported Image or Audio File", description="The specified files could not be processed. Try another something else.")
+    else:
+        print(output)
+        ui.show_error("Failed to export video", description="Check Anchorpoint Console")
+
+
+def encode_segments(ffmpeg_path, selected_files, fps, scale, is_exr, encode_tier):
+    # Long sequences are encoded in chunks that are cached on their own, so that
+    # changing a few frames only re-encodes the chunks that contain them
+    settings = ["segment", fps, encode_arguments(scale, encode_tier), is_exr]
+    queue = ffmpeg_helper.get_job_queue()
+    segments = []
+    jobs = []
+
+    for start in range(0, len(selected_files), ffmpeg_cache.CHUNK_FRAMES):
+        chunk = selected_files[start : start + ffmpeg_cache.CHUNK_FRAMES]
+        key = ffmpeg_cache.get_key(chunk, settings)
+        segment = ffmpeg_cache.get_segment_path(key)
+        segments.append(segment)
+        if ffmpeg_cache.has_segment(key):
+            continue
+
+        arguments, concat_file = input_arguments(chunk, fps, is_exr)
+        arguments = (
+            [ffmpeg_path]
+            + arguments
+            + ["-frames:v", str(len(chunk))]
+            + encode_arguments(scale, encode_tier)
+            + ["-an", "-f", "mp4", segment + ".part"]
+        )
+        job = queue.submit(
+            arguments,
+            f"{filename}.mp4",
+            key=key,
+            total_frames=len(chunk),
+            cleanup=[concat_file] if concat_file else None,
+        )
+        jobs.append((job, segment))
+
+    for job, segment in jobs:
+        job.wait()
+
+    # Finished chunks are kept for the next run, unfinished ones are removed
+    failed_job = None
+    for job, segment in jobs:
+        if job.succeeded():
+            if os.path.isfile(segment + ".part"):
+                os.replace(segment + ".part", segment)
+            continue
+        failed_job = failed_job or job
+        try:
+            if os.path.isfile(segment + ".part"):
+                os.remove(segment + ".part")
+        except OSError:
+            pass
+
+    if failed_job:
+        return None, failed_job
+    return segments, None
+
+
+def ffmpeg_seq_to_video(ffmpeg_path, target_folder, fps, selected_files, scale, audio_path=None, encode_tier=None):
     if len(selected_files) == 1 and mimetypes.guess_type(selected_files[0])[
         0
     ].startswith("video"):
@@ -42,110 +242,87 @@ def ffmpeg_seq_to_video(ffmpeg_path, target_folder, fps, selected_files, scale,
     else:
         progress_infinite = False
 
-    # Show Progress
-    progress = ap.Progress(
-        "Images to Video", "Preparing...", infinite=progress_infinite, cancelable=True
-    )
-
-    # Provide FFmpeg with the set of selected files through the concat demuxer
-    concat_file = concat_demuxer(selected_files, fps)
+    is_exr = "exr" in ctx.suffix
+    output_path = os.path.join(target_folder, f"{filename}.mp4")
 
-    arguments = [
-        ffmpeg_path,
-        "-r", fps,
-        "-y",
-        "-f", "concat",
-        "-safe", "0",
-        "-i", concat_file,
-    ]
+    # Unchanged inputs with the same settings have already been converted
+    cache_files = selected_files + ([audio_path] if audio_path else [])
+    try:
+        cache_key = ffmpeg_cache.get_key(
+            cache_files, [fps, encode_arguments(scale, encode_tier), audio_path, is_exr]
+        )
+    except OSError:
+        cache_key = None
+    if cache_key and ffmpeg_cache.is_output_current(cache_key, output_path):
+        ui.show_success("Export Successful", description=f"{filename}.mp4 is up to date")
+        return
+
+    queue = ffmpeg_helper.get_job_queue()
+    concat_file = None
+    if progress_infinite or len(selected_files) <= ffmpeg_cache.CHUNK_FRAMES:
+        arguments, concat_file = input_arguments(selected_files, fps, is_exr)
+        arguments = [ffmpeg_path] + arguments
+
+        if audio_path:
+            arguments.extend(["-i", audio_path])
+
+        # A pattern would read on past the selection if more frames exist
+        if not progress_infinite:
+            arguments.extend(["-frames:v", str(len(selected_files))])
+
+        arguments.extend(encode_arguments(scale, encode_tier))
+        total_frames = 0 if progress_infinite else len(selected_files) + 1
+    else:
+        segments, failed_job = encode_segments(
+            ffmpeg_path, selected_files, fps, scale, is_exr, encode_tier
+        )
+        if failed_job:
+            if failed_job.canceled:
+                ui.show_info("Canceled")
+            else:
+                show_job_error(failed_job, audio_path)
+            return
 
-    if audio_path:
-        arguments.extend(["-i", audio_path])
+        # Joining the encoded chunks only copies the video stream
+        concat_file = os.path.join(
+            tempfile.gettempdir(), f"{create_random_text()}.txt"
+        )
+        with open(concat_file, "w", encoding="utf-8") as file:
+            for segment in segments:
+                file.write(f"file '{segment}'\n")
 
-    arguments.extend([
-        "-hide_banner",
-        "-fps_mode", "vfr",
-        "-pix_fmt", "yuv420p",
-        "-vf", scale + ",pad=ceil(iw/2)*2:ceil(ih/2)*2",
-    ])
+        arguments = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", concat_file]
+        if audio_path:
+            arguments.extend(["-i", audio_path, "-map", "0:v", "-map", "1:a"])
+        arguments.extend(["-hide_banner", "-c:v", "copy"])
+        total_frames = 0
 
     if audio_path:
         arguments.extend(["-c:a", "aac", "-shortest"])
 
-    arguments.append(os.path.join(target_folder, f"{filename}.mp4"))
-
-    is_exr = "exr" in ctx.suffix
-
-    if is_exr:
-        arguments.insert(1, "-apply_trc")
-        arguments.insert(2, "iec61966_2_1")
-
-    args = {
-        "args": arguments,
-        "stdout": subprocess.PIPE,
-        "stderr": subprocess.PIPE,
-        "stdin": subprocess.PIPE,
-        "bufsize": 1,
-        "universal_newlines": True,
-    }
-
-    if platform.system() == "Windows":
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        args["startupinfo"] = startupinfo
-
-    ffmpeg = subprocess.Popen(**args, encoding="utf-8")
-
-    # progress bar calculation
-    percentage = 0
-    drop_frame = 0
-
-    # progress bar
-    output = ""
-    for line in ffmpeg.stderr:
-        output += line
-        if not output.endswith("\n"):
-            output += "\n"
-
-        if "Error opening input file" in line and audio_path in line:
-            print(line)
-            ui.show_error("Unsupported Audio File", description="The specified audio file could not be opened. Please check the file path and format.")
-            ffmpeg.terminate()
-            ffmpeg.wait()
-            os.remove(concat_file)
-            return
-
-        if "drop_frames=" in line:
-            drop_frame = re.search(r"(\d+)", line).group()
-
-        if "frame=" in line and not progress_infinite:
-            current_frame = re.search(r"(\d+)", line).group()
-            percentage = (int(current_frame) + int(drop_frame)) / (
-                len(selected_files) + 1
-            )
-            progress.report_progress(percentage)
-            progress.set_text(f"{int(percentage*100)}% encoded")
-
-        if progress.canceled:
-            ui.show_info("Canceled")
-            ffmpeg.terminate()
-            ffmpeg.wait()
-            os.remove(concat_file)
-            return
-
-    ffmpeg.wait()
+    arguments.append(output_path)
+
+    # All conversions share one queue so that a large selection does not start
+    # dozens of FFmpeg processes at the same time
+    job = queue.submit(
+        arguments,
+        f"{filename}.mp4",
+        key=f"{cache_key}|{output_path}" if cache_key else None,
+        total_frames=total_frames,
+        cleanup=[concat_file] if concat_file else None,
+        target=output_path,
+    )
+    job.wait()
 
-    if ffmpeg.returncode != 0:
-        if "Error opening input files: Invalid data found when processing input" in output:
-            ui.show_error("Unsupported Image or Audio File", description="The specified files could not be processed. Try another something else.")
-        else:
-            print(output)
-            ui.show_error("Failed to export video", description="Check Anchorpoint Console")
+    if job.canceled:
+        ui.show_info("Canceled")
+    elif job.returncode != 0:
+        show_job_error(job, audio_path)
     else:
+        if cache_key:
+            ffmpeg_cache.store_output(cache_key, output_path)
         ui.show_success("Export Successful", description=f"Created {filename}.mp4")
 
-    # Do some cleanup
-    os.remove(concat_file)
 
 def get_filename():
     try:
@@ -189,11 +366,31 @@ def main():
         # Get audio track from settings
         add_audio = settings.get("add_audio", False)
         audio_path = settings.get("audio_track", "") if add_audio else None
+
+        encode_tier = settings.get("encode_tier")
+        if encode_tier == "":
+            encode_tier = ffmpeg_helper.DEFAULT_ENCODE_TIER
         
         ffmpeg_helper.guarantee_ffmpeg(
-            ffmpeg_seq_to_video, ffmpeg_path, path, fps, sorted(ctx.selected_files), scale, audio_path
+            ffmpeg_seq_to_video,
+            ffmpeg_path,
+            path,
+            fps,
+            sorted(ctx.selected_files, key=natural_sort_key),
+            scale,
+            audio_path,
+            encode_tier,
         )
 
+def on_application_started(ctx: ap.Context):
+    # Conversions that were still running when Anchorpoint was closed are
+    # finished in the background, with the usual progress and result
+    try:
+        ctx.run_async(ffmpeg_helper.resume_jobs)
+    except Exception as e:
+        print(f"Could not resume video conversions: {e}")
+
+
 def run_action(ext_ctx,ext_ui):
     global ctx 
     ctx = ext_ctx
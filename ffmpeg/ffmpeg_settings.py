@@ -1,7 +1,9 @@
 import anchorpoint as ap
 import apsync as aps
 import os
+import json
 import platform
+import ffmpeg_helper
 import ffmpeg_img_to_video
 
 ctx = ap.get_context()
@@ -12,6 +14,8 @@ framerate_var = "25"
 location_var = "Same Folder"
 path_var = "path"
 resolution_var = "Original"
+encode_tier_var = "encode_tier"
+benchmark_var = "benchmark"
 audio_track_var = "audio_track"
 add_audio_switch_var = "add_audio_switch"
 
@@ -21,6 +25,7 @@ def button_clicked(dialog):
     location = dialog.get_value(location_var)
     path = dialog.get_value(path_var)
     resolution = dialog.get_value(resolution_var)
+    encode_tier = dialog.get_value(encode_tier_var)
     audio_track = dialog.get_value(audio_track_var)
     add_audio = dialog.get_value(add_audio_switch_var)
 
@@ -32,6 +37,7 @@ def button_clicked(dialog):
     settings.set("fps", fps)
     settings.set("location", location)
     settings.set("resolution", resolution)
+    settings.set("encode_tier", encode_tier)
     settings.set("audio_track", audio_track)
     settings.set("add_audio", add_audio)
 
@@ -48,6 +54,38 @@ def add_audio_callback(dialog, value):
     dialog.set_enabled(audio_track_var, value)
 
 
+def get_benchmark_text():
+    try:
+        results = json.loads(settings.get("benchmark_results"))
+    except (TypeError, ValueError):
+        results = None
+    if not results:
+        return "Measure how fast each quality encodes on this computer"
+    return "Frames/sec on this computer: " + ", ".join(
+        f"{tier} <b>{fps:.0f}</b>" for tier, fps in results.items()
+    )
+
+
+def run_benchmark(dialog):
+    progress = ap.Progress("Video Conversion", "Measuring encoding speed", infinite=True)
+    results = ffmpeg_helper.benchmark_encode_tiers(
+        ffmpeg_helper.get_ffmpeg_fullpath()
+    )
+    progress.finish()
+
+    if not results:
+        ap.UI().show_error("Benchmark failed", "Check Anchorpoint Console")
+        return
+
+    settings.set("benchmark_results", json.dumps(results))
+    settings.store()
+    dialog.set_value(benchmark_var, get_benchmark_text())
+
+
+def benchmark_clicked(dialog):
+    ffmpeg_helper.guarantee_ffmpeg(run_benchmark, dialog)
+
+
 def open_dialog():
     fps = settings.get("fps")
     location = settings.get("location")
@@ -68,6 +106,10 @@ def open_dialog():
     if resolution == "":
         resolution = "Original"
 
+    encode_tier = settings.get("encode_tier")
+    if encode_tier not in ffmpeg_helper.ENCODE_TIERS:
+        encode_tier = ffmpeg_helper.DEFAULT_ENCODE_TIER
+
     if path == "":
         if platform.system() == "Darwin":
             path = os.path.expanduser("~/Desktop")
@@ -104,6 +146,13 @@ def open_dialog():
         width=320
     )
     dialog.add_info("Adjusts the video to the smaller height or width")
+    dialog.add_text("Quality", width=88).add_dropdown(
+        encode_tier,
+        list(ffmpeg_helper.ENCODE_TIERS.keys()),
+        var=encode_tier_var,
+        width=320
+    )
+    dialog.add_info(get_benchmark_text(), var=benchmark_var)
     dialog.add_switch(
         text="Add Audio Track",
         var=add_audio_switch_var,
@@ -123,7 +172,9 @@ def open_dialog():
     )
     
     dialog.add_info("Adds an audio track and adjusts it to the length of the sequence")
-    dialog.add_button("Convert", callback=button_clicked)
+    dialog.add_button("Convert", callback=button_clicked).add_button(
+        "Benchmark", callback=benchmark_clicked, primary=False
+    )
     dialog.hide_row(path_var, location_bool)
 
     if ctx.icon:
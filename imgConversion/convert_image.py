@@ -0,0 +1,110 @@
+import anchorpoint as ap
+import apsync as aps
+import os
+import image_converter
+
+ctx = ap.get_context()
+ui = ap.UI()
+settings = aps.Settings("convert_image")
+
+format_var = "format"
+size_var = "size"
+
+
+def check_and_install_modules(input_paths):
+    try:
+        from PIL import Image  # noqa: F401
+    except ImportError:
+        progress = ap.Progress("Loading Modules", infinite=True)
+        ui.show_info("Loading Modules", description="This will only happen once")
+        ctx.install("Pillow")
+        progress.finish()
+
+    # EXR and HDR files can only be decoded with OpenImageIO, TIFF and PSD
+    # files are read in strips with it instead of decoding them at full size
+    needs_openimageio = any(
+        image_converter.needs_openimageio(path) for path in input_paths
+    )
+    if needs_openimageio and not image_converter.has_openimageio():
+        progress = ap.Progress("Loading Modules", infinite=True)
+        ui.show_info("Loading Modules", description="This will only happen once")
+        try:
+            ctx.install("OpenImageIO")
+        except Exception as e:
+            print(e)
+        progress.finish()
+
+
+def convert_images(input_paths, image_format, size):
+    check_and_install_modules(input_paths)
+
+    progress = ap.Progress(
+        "Converting Images", f"Converting to {image_format}", cancelable=True
+    )
+    converted = 0
+    for index, input_path in enumerate(input_paths):
+        if progress.canceled:
+            break
+        progress.set_text(os.path.basename(input_path))
+        progress.report_progress(index / len(input_paths))
+        try:
+            image_converter.convert_image(
+                input_path, os.path.dirname(input_path), image_format, size
+            )
+            converted += 1
+        except Exception as e:
+            print(f"Could not convert {input_path}: {e}")
+    progress.finish()
+
+    if converted == len(input_paths):
+        ui.show_success(
+            "Images converted", f"{converted} files written as {image_format}"
+        )
+    elif converted > 0:
+        ui.show_info(
+            f"Converted {converted} of {len(input_paths)} images",
+            "Check Anchorpoint Console",
+        )
+    else:
+        ui.show_error("Cannot convert images", "Check Anchorpoint Console")
+    ui.reload()
+
+
+def button_clicked(dialog):
+    image_format = dialog.get_value(format_var)
+    size = dialog.get_value(size_var)
+    settings.set("format", image_format)
+    settings.set("size", size)
+    settings.store()
+    dialog.close()
+
+    ctx.run_async(convert_images, ctx.selected_files or [ctx.path], image_format, size)
+
+
+def open_dialog():
+    image_format = settings.get("format", "PNG")
+    if image_format not in image_converter.FORMATS:
+        image_format = "PNG"
+    size = settings.get("size", "Original")
+    if size not in image_converter.SIZES:
+        size = "Original"
+
+    dialog = ap.Dialog()
+    dialog.title = "Convert Images"
+    if ctx.icon:
+        dialog.icon = ctx.icon
+
+    dialog.add_text("Format").add_dropdown(
+        image_format, list(image_converter.FORMATS.keys()), var=format_var
+    )
+    dialog.add_text("Size").add_dropdown(
+        size, list(image_converter.SIZES.keys()), var=size_var
+    )
+    dialog.add_info(
+        "Images larger than the chosen size are scaled down,<br>the converted files are placed next to the originals"
+    )
+    dialog.add_button("Convert", callback=button_clicked)
+    dialog.show()
+
+
+open_dialog()
@@ -2,51 +2,163 @@
 import anchorpoint as ap
 import apsync as aps
 import os
+import shutil
 import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+# Converted images stay on disk so that they can be pasted from the clipboard.
+# Older conversions are removed once the folder grows beyond this size
+MAX_CACHE_SIZE = 512 * 1024 * 1024
 
-def get_image(workspace_id, input_path):
+
+def get_images(workspace_id, input_paths, workers=1):
     # start progress
     progress = ap.Progress("Copying image", "Processing", infinite=True)
     # create temporary folder
     output_folder = create_temp_directory()
 
-    # generate the thumbnail which is a png file and put it in the temporary directory
-    aps.generate_thumbnails(
-        [input_path],
-        output_folder,
-        with_detail=True,
-        with_preview=False,
-        workspace_id=workspace_id,
-    )
+    # generate the thumbnails which are png files and put them in the temporary directory.
+    # All files are converted with one call, only files with the same name would
+    # overwrite each other, so they go into separate batches.
+    # With more than one worker, the files are split up and converted in parallel
+    batches = split_batches(input_paths)
+    if workers > 1 and len(batches) == 1 and len(input_paths) > 1:
+        batches = [input_paths[i::workers] for i in range(workers)]
+        batches = [batch for batch in batches if batch]
 
-    # get the proper filename, rename it because the generated PNG file has a _pt appendix
-    file_name = os.path.basename(input_path).split(".")[0]
-    image_path = os.path.join(output_folder, file_name + str("_dt") + str(".png"))
+    jobs = [
+        (batch, os.path.join(output_folder, str(index)))
+        for index, batch in enumerate(batches)
+    ]
+    image_paths = []
+    if workers > 1 and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(convert, workspace_id, batch, folder)
+                for batch, folder in jobs
+            ]
+            for future in futures:
+                image_paths.extend(future.result())
+    else:
+        for batch, folder in jobs:
+            image_paths.extend(convert(workspace_id, batch, folder))
 
-    if not os.path.exists(image_path):
+    if not image_paths:
         ap.UI().show_error(
             "Cannot copy to clipboard", "PNG file could not be generated"
         )
         progress.finish()
         return
 
-    renamed_image_path = os.path.join(output_folder, file_name + str(".png"))
-    os.rename(image_path, renamed_image_path)
-
     # trigger the copy to clipboard function
-    ap.copy_files_to_clipboard([renamed_image_path])
+    ap.copy_files_to_clipboard(image_paths)
 
-    ap.UI().show_success("Image copied to clipboard", "Paste it as a PNG file")
+    if len(image_paths) < len(input_paths):
+        ap.UI().show_info(
+            f"Copied {len(image_paths)} of {len(input_paths)} images to clipboard",
+            "Some PNG files could not be generated",
+        )
+    elif len(image_paths) > 1:
+        ap.UI().show_success(
+            f"{len(image_paths)} images copied to clipboard", "Paste them as PNG files"
+        )
+    else:
+        ap.UI().show_success("Image copied to clipboard", "Paste it as a PNG file")
 
     progress.finish()
 
 
+def get_file_name(input_path):
+    # Only the extension is removed, names like shot.v02.exr keep their version
+    return os.path.splitext(os.path.basename(input_path))[0]
+
+
+def split_batches(input_paths):
+    batches = []
+    for input_path in input_paths:
+        file_name = get_file_name(input_path).lower()
+        for batch in batches:
+            if file_name not in batch:
+                batch[file_name] = input_path
+                break
+        else:
+            batches.append({file_name: input_path})
+    return [list(batch.values()) for batch in batches]
+
+
+def convert(workspace_id, input_paths, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    aps.generate_thumbnails(
+        input_paths,
+        output_folder,
+        with_detail=True,
+        with_preview=False,
+        workspace_id=workspace_id,
+    )
+
+    image_paths = []
+    for input_path in input_paths:
+        # get the proper filename, rename it because the generated PNG file has a _dt appendix
+        file_name = get_file_name(input_path)
+        image_path = os.path.join(output_folder, file_name + str("_dt") + str(".png"))
+        if not os.path.exists(image_path):
+            continue
+
+        renamed_image_path = os.path.join(output_folder, file_name + str(".png"))
+        os.replace(image_path, renamed_image_path)
+        image_paths.append(renamed_image_path)
+    return image_paths
+
+
+def get_cache_directory():
+    return os.path.join(tempfile.gettempdir(), "anchorpoint_copy_as_png")
+
+
+def cleanup_cache(max_size=MAX_CACHE_SIZE):
+    # Remove the oldest conversions until the cache fits into max_size
+    cache_directory = get_cache_directory()
+    folders = []
+    total_size = 0
+    for entry in os.scandir(cache_directory):
+        if not entry.is_dir():
+            continue
+        size = 0
+        for root, _, files in os.walk(entry.path):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        folders.append((entry.stat().st_mtime, size, entry.path))
+        total_size += size
+
+    for _, size, path in sorted(folders):
+        if total_size <= max_size:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
 def create_temp_directory():
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
+    # Create a temporary directory within the shared cache folder
+    cache_directory = get_cache_directory()
+    os.makedirs(cache_directory, exist_ok=True)
+    cleanup_cache()
+
+    temp_dir = os.path.join(
+        cache_directory, f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    )
+    os.makedirs(temp_dir)
     return temp_dir
 
 
 ctx = ap.get_context()
-ctx.run_async(get_image, ctx.workspace_id, ctx.path)
+settings = aps.Settings("copy_as_png")
+ctx.run_async(
+    get_images,
+    ctx.workspace_id,
+    ctx.selected_files or [ctx.path],
+    int(settings.get("parallel_workers", 1) or 1),
+)
@@ -0,0 +1,44 @@
+import anchorpoint as ap
+import apsync as aps
+
+ctx = ap.get_context()
+settings = aps.Settings("copy_as_png")
+
+workers_var = "parallel_workers"
+WORKER_OPTIONS = ["1", "2", "4", "8"]
+
+
+def button_clicked(dialog):
+    settings.set("parallel_workers", int(dialog.get_value(workers_var)))
+    settings.store()
+    dialog.close()
+
+
+def open_dialog():
+    workers = str(settings.get("parallel_workers", 1))
+    if workers not in WORKER_OPTIONS:
+        workers = WORKER_OPTIONS[0]
+
+    dialog = ap.Dialog()
+    dialog.title = "Copy as PNG Settings"
+    dialog.add_text("Parallel Conversions").add_dropdown(
+        workers, WORKER_OPTIONS, var=workers_var
+    )
+    dialog.add_info(
+        "Converts the selected images in several batches at the same time.<br>"
+        "Helps with many large files, but needs more memory"
+    )
+    dialog.add_button("Apply", callback=button_clicked)
+
+    if ctx.icon:
+        dialog.icon = ctx.icon
+
+    dialog.show()
+
+
+def main():
+    open_dialog()
+
+
+if __name__ == "__main__":
+    main()
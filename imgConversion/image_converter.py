@@ -0,0 +1,266 @@
+# Converts large images (EXR, TIFF, PSD, ...) to PNG, JPEG or WebP at a chosen size.
+# Images are read in strips of scanlines that are downscaled right away, so that
+# even 16k textures never have to be held in memory at full resolution.
+# OpenImageIO is used for decoding if it is installed. Pillow is the fallback,
+# it can only decode JPEG files at a lower resolution, everything else is
+# decoded at full size.
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+FORMATS = {
+    "PNG": {"extension": "png", "pillow": "PNG", "options": {"optimize": False}},
+    "JPEG": {"extension": "jpg", "pillow": "JPEG", "options": {"quality": 92}},
+    "WebP": {"extension": "webp", "pillow": "WEBP", "options": {"quality": 90}},
+}
+
+# Longest edge of the converted image, None keeps the original size
+SIZES = {
+    "Original": None,
+    "4096 px": 4096,
+    "2048 px": 2048,
+    "1024 px": 1024,
+    "512 px": 512,
+}
+
+# Upper limit for the decoded pixels of one strip
+MAX_STRIP_BYTES = 64 * 1024 * 1024
+
+# Formats that store linear color and need to be converted to sRGB
+LINEAR_EXTENSIONS = (".exr", ".hdr")
+
+# Formats that Pillow can decode at a lower resolution (draft mode), all
+# others are read in strips with OpenImageIO to keep the memory low
+DRAFT_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def needs_openimageio(path):
+    return not path.lower().endswith(DRAFT_EXTENSIONS)
+
+
+def has_openimageio():
+    try:
+        import OpenImageIO  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_worker_count():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def get_target_size(width, height, max_size):
+    if not max_size or max(width, height) <= max_size:
+        return width, height
+    scale = max_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _box_reduce(pixels, factor):
+    # Averages factor x factor blocks, leftover rows/columns at the edge are dropped
+    import numpy as np
+
+    if factor <= 1:
+        return pixels
+    height = pixels.shape[0] // factor * factor
+    width = pixels.shape[1] // factor * factor
+    pixels = pixels[:height, :width]
+    return pixels.reshape(
+        height // factor, factor, width // factor, factor, pixels.shape[2]
+    ).mean(axis=(1, 3), dtype=np.float32)
+
+
+def _to_8bit(pixels, linear):
+    import numpy as np
+
+    pixels = np.clip(pixels, 0.0, 1.0)
+    if linear:
+        pixels = np.where(
+            pixels <= 0.0031308,
+            pixels * 12.92,
+            1.055 * np.power(pixels, 1 / 2.4) - 0.055,
+        )
+    return (pixels * 255.0 + 0.5).astype(np.uint8)
+
+
+def _reduce_strip(pixels, factor, linear):
+    # Only the 8-bit result of a strip is kept, the float pixels are dropped
+    return _to_8bit(_box_reduce(pixels, factor), linear)
+
+
+def _read_openimageio(path, max_size, workers):
+    import numpy as np
+    import OpenImageIO as oiio
+
+    image_input = oiio.ImageInput.open(path)
+    if image_input is None:
+        raise IOError(oiio.geterror())
+
+    try:
+        spec = image_input.spec()
+
+        # Tiled files often contain smaller MIP levels, start from the smallest
+        # level that is still larger than the target
+        miplevel = 0
+        target_width, target_height = get_target_size(spec.width, spec.height, max_size)
+        while image_input.seek_subimage(0, miplevel + 1):
+            smaller = image_input.spec()
+            if smaller.width < target_width or smaller.height < target_height:
+                break
+            miplevel += 1
+            spec = smaller
+        image_input.seek_subimage(0, miplevel)
+
+        channels = min(spec.nchannels, 4)
+        factor = max(1, min(spec.width // target_width, spec.height // target_height))
+        row_bytes = spec.width * channels * 4
+
+        # Strips have to start at a tile boundary in tiled files and at a
+        # multiple of the downscale factor, so that no pixels are averaged twice
+        step = math.lcm(factor, spec.tile_height or 1)
+        strip_height = max(step, MAX_STRIP_BYTES // row_bytes // step * step)
+
+        # The 8-bit result is the only full size buffer, every strip is written
+        # into it as soon as it has been reduced
+        linear = path.lower().endswith(LINEAR_EXTENSIONS)
+        ranges = [
+            (y, min(y + strip_height, spec.y + spec.height))
+            for y in range(spec.y, spec.y + spec.height, strip_height)
+        ]
+        offsets = [0]
+        for y, y_end in ranges:
+            offsets.append(offsets[-1] + (y_end - y) // factor)
+        result = np.empty((offsets[-1], spec.width // factor, channels), np.uint8)
+
+        def store(future, index):
+            strip = future.result()
+            result[offsets[index] : offsets[index] + strip.shape[0]] = strip
+
+        # Reading has to happen in order, downscaling runs on the other cores
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for index, (y, y_end) in enumerate(ranges):
+                if spec.tile_width:
+                    pixels = image_input.read_tiles(
+                        0,
+                        miplevel,
+                        spec.x,
+                        spec.x + spec.width,
+                        y,
+                        y_end,
+                        spec.z,
+                        spec.z + 1,
+                        0,
+                        channels,
+                        oiio.FLOAT,
+                    )
+                else:
+                    pixels = image_input.read_scanlines(
+                        0, miplevel, y, y_end, spec.z, 0, channels, oiio.FLOAT
+                    )
+                if pixels is None:
+                    raise IOError(image_input.geterror())
+                future = executor.submit(_reduce_strip, pixels, factor, linear)
+                pending.append((future, index))
+
+                # Limit the number of decoded strips that are held in memory
+                while len(pending) > workers * 2:
+                    store(*pending.pop(0))
+            for future, index in pending:
+                store(future, index)
+    finally:
+        image_input.close()
+
+    return result, channels
+
+
+def _read_pillow(path, max_size, workers):
+    from PIL import Image
+
+    image = Image.open(path)
+    target_size = get_target_size(image.width, image.height, max_size)
+
+    # JPEG files can be decoded at a lower resolution right away
+    image.draft("RGB", target_size)
+
+    # Decoding is not thread safe, so the image is loaded once before the
+    # bands are reduced from the loaded pixels
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    factor = max(1, min(image.width // target_size[0], image.height // target_size[1]))
+    if factor > 1:
+        # Reduce horizontal bands in parallel, Pillow releases the GIL while resizing
+        # Leftover rows/columns at the edge are dropped like in _box_reduce
+        width = image.width // factor * factor
+        height = image.height // factor * factor
+        band_height = max(factor, height // workers // factor * factor)
+        boxes = [
+            (0, y, width, min(y + band_height, height))
+            for y in range(0, height, band_height)
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            bands = list(executor.map(lambda box: image.reduce(factor, box), boxes))
+
+        reduced = Image.new(
+            image.mode, (image.width // factor, sum(b.height for b in bands))
+        )
+        y = 0
+        for band in bands:
+            reduced.paste(band, (0, y))
+            y += band.height
+        image = reduced
+    return image
+
+
+def get_output_path(path, output_folder, image_format, size):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if SIZES.get(size):
+        name = f"{name}_{SIZES[size]}"
+    output = os.path.join(output_folder, f"{name}.{FORMATS[image_format]['extension']}")
+
+    # Never overwrite the source image
+    if os.path.normcase(os.path.abspath(output)) == os.path.normcase(
+        os.path.abspath(path)
+    ):
+        output = os.path.join(
+            output_folder, f"{name}_converted.{FORMATS[image_format]['extension']}"
+        )
+    return output
+
+
+def convert_image(
+    path, output_folder, image_format="PNG", size="Original", workers=None
+):
+    from PIL import Image
+
+    workers = workers or get_worker_count()
+    max_size = SIZES.get(size)
+    output_format = FORMATS[image_format]
+
+    if has_openimageio():
+        pixels, channels = _read_openimageio(path, max_size, workers)
+        modes = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+        if channels == 1:
+            pixels = pixels[:, :, 0]
+        image = Image.fromarray(pixels, modes[channels])
+    else:
+        if path.lower().endswith(LINEAR_EXTENSIONS):
+            raise ValueError("OpenImageIO is required to convert EXR and HDR files")
+        if needs_openimageio(path):
+            print(f"OpenImageIO is not installed, {path} is decoded at full size")
+        image = _read_pillow(path, max_size, workers)
+
+    # The strips are reduced by whole factors, the exact size is done here
+    target_size = get_target_size(image.width, image.height, max_size)
+    if image.size != target_size:
+        image = image.resize(target_size, Image.LANCZOS)
+
+    if output_format["pillow"] == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    output = get_output_path(path, output_folder, image_format, size)
+    image.save(output, output_format["pillow"], **output_format["options"])
+    return output
@@ -3,95 +3,278 @@ import apsync as aps
 import os
 import sys
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import publish_copy
+import publish_journal
+import publish_ledger
 
 ctx = ap.Context.instance()
 project = aps.get_project(ctx.project_path)
 ui = ap.UI()
 api = ap.get_api()
 
+# Files are published in parallel, each large file uses its own copy streams
+MAX_PUBLISH_WORKERS = 4
 
-def split_name_and_version(filename):
+VERSION_PATTERNS = [
     # This regex matches any number of digits,
     # optionally preceded by 'v' or '_v', and optionally separated by '_'
     # It allows for additional content after the version number
-    match = re.search(r'(.*?)(?:_v?(\d+))(?:_|$)', filename, re.IGNORECASE)
-    if match:
-        return match.group(1), match.group(2)
-    
+    re.compile(r"(.*?)(?:_v?(\d+))(?:_|$)", re.IGNORECASE),
     # If no match with underscore, try matching 'v' followed by digits at the end
-    match = re.search(r'(.*?v)(\d+)$', filename, re.IGNORECASE)
-    if match:
-        return match.group(1), match.group(2)
-    
+    re.compile(r"(.*?v)(\d+)$", re.IGNORECASE),
     # If still no match, try matching any digits at the end
-    match = re.search(r'(.*?)(\d+)$', filename)
-    if match:
-        return match.group(1), match.group(2)
-    
+    re.compile(r"(.*?)(\d+)$"),
+]
+
+
+def split_name_and_version(filename):
+    for pattern in VERSION_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            return match.group(1), match.group(2)
+
     return filename, None
 
-def copy(settings):
+
+def split_path(path):
+    filename, suffix = os.path.splitext(os.path.basename(path))
+    return filename, suffix[1:]
+
+
+def find_latest_versions(paths):
+    # Keeps the highest version per base name and file type
+    latest = {}
+    for path in paths:
+        filename, suffix = split_path(path)
+        base_name, version = split_name_and_version(filename)
+        if version is None:
+            continue
+        key = (base_name.lower(), suffix.lower())
+        if key not in latest or int(version) > latest[key][0]:
+            latest[key] = (int(version), path)
+    return sorted(path for _, path in latest.values())
+
+
+def scan_folder(folder):
+    # One scan of the folder for all versioned files
+    with os.scandir(folder) as entries:
+        return find_latest_versions(
+            [entry.path for entry in entries if entry.is_file()]
+        )
+
+
+def get_publish_location(folder, settings):
+    new_location = folder
+
+    try:
+        if settings["publish_file_location"] != "":
+            new_location = settings["publish_file_location"]
+    except:
+        new_location = folder
+
+    # possibility to publish in parent folder and adding relative paths
+    location_split = new_location.split("../")
+    backsteps = len(location_split)
+    if backsteps > 1:
+        new_location = folder
+        x = range(1, backsteps)
+        for i in x:
+            new_location = os.path.dirname(new_location)
+        appendix = location_split[-1]
+
+        new_location = new_location + "/" + appendix
+        # check if folder is correct
+        if not os.path.isdir(new_location):
+            return None
+
+    return new_location
+
+
+def get_publish_path(path, settings):
+    filename, suffix = split_path(path)
+    base_name, _ = split_name_and_version(filename)
+
+    new_name_appendix = base_name
+
+    try:
+        new_name_appendix += settings["publish_version_appendix"]
+    except:
+        pass
+
+    new_location = get_publish_location(os.path.dirname(path), settings)
+    if new_location is None:
+        return None
+    return os.path.join(new_location, new_name_appendix + "." + suffix)
+
+
+def publish_file(path, new_path, byte_progress, verify=False):
+    # Skip the copy when the published file is already up to date
+    if publish_copy.is_identical(path, new_path, verify):
+        byte_progress.add(os.path.getsize(path))
+        return None
+
+    # Write next to the target and rename it when complete, so that nobody
+    # ever opens a half written published file
+    entry = publish_journal.begin(path, new_path)
+    try:
+        publish_copy.copy_file(path, entry["temp"], byte_progress.add)
+        publish_journal.set_state(entry, publish_journal.STAGED)
+        os.replace(entry["temp"], new_path)
+        publish_copy.sync_folder(os.path.dirname(new_path))
+    except BaseException:
+        publish_journal.rollback(entry)
+        raise
+    publish_journal.set_state(entry, publish_journal.REPLACED)
+    return entry
+
+
+def set_source_attribute(path, new_path):
+    api.attributes.set_attribute_value(
+        new_path, "Source File", split_path(path)[0], True
+    )
+
+
+def recover_interrupted_publishes():
+    resumed, rolled_back = publish_journal.recover(
+        lambda entry: set_source_attribute(entry["source"], entry["target"])
+    )
+    if resumed or rolled_back:
+        print(
+            f"Interrupted publishes: {resumed} finished, {rolled_back} rolled back"
+        )
+
+
+def get_input_paths():
+    if ctx.selected_files:
+        return ctx.selected_files
+    if os.path.isdir(ctx.path):
+        return scan_folder(ctx.path)
+    return [ctx.path]
+
+
+def copy(settings, input_paths=None):
     if project is None:
         ui.show_info("Action only works with projects")
         sys.exit(0)
 
-    base_name, version = split_name_and_version(ctx.filename)
-    
-    if version is not None:
-        progress = ap.Progress("Publishing", "Creating a copy")
+    recover_interrupted_publishes()
+
+    input_paths = find_latest_versions(input_paths or get_input_paths())
+    if not input_paths:
+        ui.show_error("Not an increment", "This file has no v001 or similar")
+        return
+
+    jobs = []
+    for path in input_paths:
+        new_path = get_publish_path(path, settings)
+        if new_path is None:
+            ui.show_error(
+                "Folder not set correctly",
+                "Please check your output folder in the settings.",
+            )
+            return
+        jobs.append((path, new_path))
+
+    # The publish that is replaced is shown in the message of a single file
+    previous = None
+    if len(jobs) == 1:
+        try:
+            previous = publish_ledger.get_previous(project.path, jobs[0][1])
+        except OSError:
+            previous = None
+
+    # Compares the full content instead of sampled blocks before skipping a copy
+    verify = str(settings.get("publish_verify", "False")) == "True"
 
-        new_name = base_name
+    progress = ap.Progress("Publishing", "Creating a copy")
+    byte_progress = publish_copy.ByteProgress(
+        progress, sum(os.path.getsize(path) for path, _ in jobs)
+    )
 
-        new_name_appendix = new_name
+    published = []
+    unchanged = []
+    failed = []
+    entries = []
+    records = []
+    lock = threading.Lock()
 
+    def run(job):
+        path, new_path = job
         try:
-            new_name_appendix += settings["publish_version_appendix"]
-        except:
-            pass
+            entry = publish_file(path, new_path, byte_progress, verify)
+            if entry:
+                record = {
+                    "source": path,
+                    "target": new_path,
+                    "version": split_name_and_version(split_path(path)[0])[1],
+                    "hash": publish_copy.sample_hash(new_path),
+                    "user": ctx.username,
+                }
+        except Exception as e:
+            print(f"Could not publish {path}: {e}")
+            with lock:
+                failed.append(path)
+            return
+        with lock:
+            if entry:
+                entries.append(entry)
+                records.append(record)
+                published.append(job)
+            else:
+                unchanged.append(job)
 
-        new_location = ctx.folder
+    with ThreadPoolExecutor(max_workers=MAX_PUBLISH_WORKERS) as executor:
+        list(executor.map(run, jobs))
 
+    # All files are in place, now set the attributes in one go
+    progress.set_text("Setting attributes")
+    for path, new_path in published + unchanged:
         try:
-            if settings["publish_file_location"] != "":
-                new_location = settings["publish_file_location"]
-        except:
-            new_location = ctx.folder
-
-        # possibility to publish in parent folder and adding relative paths
-        location_split = new_location.split("../")
-        backsteps = len(location_split)
-        if backsteps > 1:
-            new_location = ctx.folder
-            x = range(1, backsteps)
-            for i in x:
-                new_location = os.path.dirname(new_location)
-            appendix = location_split[-1]
-
-            new_location = new_location + "/" + appendix
-            # check if folder is correct
-            if not os.path.isdir(new_location):
-                ui.show_error(
-                    "Folder not set correctly",
-                    "Please check your output folder in the settings.",
-                )
-                return
-
-        new_path = os.path.join(new_location, new_name_appendix + "." + ctx.suffix)
-
-        aps.copy_file(ctx.path, new_path, overwrite=True)
-        api.attributes.set_attribute_value(new_path, "Source File", ctx.filename, True)
+            set_source_attribute(path, new_path)
+        except Exception as e:
+            print(f"Could not set attributes on {new_path}: {e}")
+    publish_journal.finish([entry["id"] for entry in entries])
+
+    try:
+        publish_ledger.append(project.path, records)
+    except OSError as e:
+        print(f"Could not write the publish ledger: {e}")
+    progress.finish()
 
+    if len(jobs) == 1 and not failed:
+        new_path = jobs[0][1]
+        description = f"Published in {os.path.dirname(new_path)}"
+        if previous and published:
+            description += (
+                f"<br>Replaces version {previous.get('version')}"
+                f" by {previous.get('user')}"
+            )
+        ui.show_success(f"Published {split_path(new_path)[0]}", description)
+    elif not failed:
         ui.show_success(
-            f"Published {new_name_appendix}", f"Published in {new_location}"
+            f"Published {len(jobs)} files",
+            f"{len(published)} copied, {len(unchanged)} already up to date",
         )
-        progress.finish()
-
     else:
-        ui.show_error("Not an increment", "This file has no v001 or similar")
-        return
+        ui.show_error(
+            f"Published {len(jobs) - len(failed)} of {len(jobs)} files",
+            "Check Anchorpoint Console",
+        )
+
+
+def on_application_started(ctx: ap.Context):
+    # Publishes that were interrupted by a crash or a shutdown are finished
+    # right away, not only on the next publish
+    try:
+        recover_interrupted_publishes()
+    except Exception as e:
+        print(f"Could not recover interrupted publishes: {e}")
+
 
 if __name__ == "__main__":
     ctx.run_async(copy,project.get_metadata())
 
 def run_action(ctx,settings):
-    ctx.run_async(copy,settings)
\ No newline at end of file
+    ctx.run_async(copy,settings)
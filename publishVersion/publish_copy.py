@@ -0,0 +1,158 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Files above this size are copied with several streams in parallel,
+# which is a lot faster on network drives and SSDs
+PARALLEL_COPY_SIZE = 256 * 1024 * 1024
+COPY_STREAMS = 4
+
+# Number and size of the blocks that are hashed to compare two files
+SAMPLE_COUNT = 16
+SAMPLE_SIZE = 64 * 1024
+
+
+def sample_hash(path, size=None):
+    # Hashes the start, the end and evenly spaced blocks in between,
+    # so that multi GB files can be compared in milliseconds
+    size = os.path.getsize(path) if size is None else size
+    file_hash = hashlib.sha1(str(size).encode("utf-8"))
+    with open(path, "rb") as file:
+        if size <= SAMPLE_COUNT * SAMPLE_SIZE:
+            file_hash.update(file.read())
+        else:
+            step = (size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+            for index in range(SAMPLE_COUNT):
+                file.seek(index * step)
+                file_hash.update(file.read(SAMPLE_SIZE))
+    return file_hash.hexdigest()
+
+
+def _same_content(source, target):
+    with open(source, "rb") as source_file, open(target, "rb") as target_file:
+        while True:
+            data = source_file.read(CHUNK_SIZE)
+            if data != target_file.read(CHUNK_SIZE):
+                return False
+            if not data:
+                return True
+
+
+def is_identical(source, target, verify=False):
+    try:
+        source_stat = os.stat(source)
+        target_stat = os.stat(target)
+    except OSError:
+        return False
+
+    if source_stat.st_size != target_stat.st_size:
+        return False
+
+    try:
+        # Reads both files in full, only when the user asked for it
+        if verify:
+            return _same_content(source, target)
+
+        # Published files get the modification time of their source
+        if source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+            return True
+        size = source_stat.st_size
+        return sample_hash(source, size) == sample_hash(target, size)
+    except OSError:
+        return False
+
+
+def _copy_range(source, target, start, end, on_bytes):
+    with open(source, "rb") as source_file, open(target, "r+b") as target_file:
+        source_file.seek(start)
+        target_file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = source_file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                raise IOError(f"{source} changed while copying")
+            target_file.write(data)
+            remaining -= len(data)
+            if on_bytes:
+                on_bytes(len(data))
+
+
+def copy_file(source, target, on_bytes=None, streams=COPY_STREAMS):
+    # on_bytes is called with the number of bytes that have been written.
+    # The data is flushed to disk before the function returns
+    size = os.path.getsize(source)
+
+    if size < PARALLEL_COPY_SIZE or streams <= 1:
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            while True:
+                data = source_file.read(CHUNK_SIZE)
+                if not data:
+                    break
+                target_file.write(data)
+                if on_bytes:
+                    on_bytes(len(data))
+            target_file.flush()
+            os.fsync(target_file.fileno())
+    else:
+        with open(target, "wb") as target_file:
+            target_file.truncate(size)
+
+        part_size = -(-size // streams)
+        with ThreadPoolExecutor(max_workers=streams) as executor:
+            futures = [
+                executor.submit(
+                    _copy_range,
+                    source,
+                    target,
+                    start,
+                    min(start + part_size, size),
+                    on_bytes,
+                )
+                for start in range(0, size, part_size)
+            ]
+            for future in futures:
+                future.result()
+
+        with open(target, "r+b") as target_file:
+            os.fsync(target_file.fileno())
+
+    shutil.copystat(source, target)
+
+
+class ByteProgress:
+    # Reports the written bytes of all files to one ap.Progress
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = max(total, 1)
+        self.done = 0
+        self.reported = 0
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+            # Only report whole percents, the UI does not need more
+            if self.done - self.reported < self.total / 100 and self.done < self.total:
+                return
+            self.reported = self.done
+        self.progress.report_progress(min(self.done / self.total, 1.0))
+
+
+def sync_folder(folder):
+    # Makes a rename durable, folders cannot be opened for that on Windows
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
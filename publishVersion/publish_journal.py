@@ -0,0 +1,171 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+# Every publish is written to a temporary file next to the target first and
+# then renamed. The journal remembers publishes that are in flight, so that
+# an interrupted publish can be finished or cleaned up on the next run
+journal_path = "~/Documents/Anchorpoint/actions/publish/journal.json"
+
+COPYING = "copying"
+STAGED = "staged"
+REPLACED = "replaced"
+
+_lock = threading.Lock()
+
+# Publishes that are running in this process, they must not be recovered
+_active = set()
+
+# Windows process access right and exit code of a running process
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+
+def get_journal_path():
+    path = os.path.normpath(os.path.expanduser(journal_path))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _load():
+    try:
+        with open(get_journal_path(), "r", encoding="utf-8") as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def _save(entries):
+    path = get_journal_path()
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(entries, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def get_temp_path(target, entry_id):
+    folder, name = os.path.split(target)
+    return os.path.join(folder, f".{name}.{entry_id[:8]}.publishing")
+
+
+def begin(source, target):
+    entry_id = uuid.uuid4().hex
+    entry = {
+        "id": entry_id,
+        "source": source,
+        "target": target,
+        "temp": get_temp_path(target, entry_id),
+        "state": COPYING,
+        "time": time.time(),
+        "pid": os.getpid(),
+        "host": socket.gethostname(),
+    }
+    with _lock:
+        entries = _load()
+        entries[entry_id] = entry
+        _save(entries)
+        _active.add(entry_id)
+    return entry
+
+
+def set_state(entry, state):
+    entry["state"] = state
+    with _lock:
+        entries = _load()
+        entries[entry["id"]] = entry
+        _save(entries)
+
+
+def finish(entry_ids):
+    with _lock:
+        entries = _load()
+        for entry_id in entry_ids:
+            entries.pop(entry_id, None)
+            _active.discard(entry_id)
+        _save(entries)
+
+
+def rollback(entry):
+    try:
+        os.remove(entry["temp"])
+    except OSError:
+        pass
+    finish([entry["id"]])
+
+
+def _is_running(pid):
+    if os.name == "nt":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_abandoned(entry):
+    # Only publishes whose Anchorpoint has quit can be recovered. Entries of
+    # another computer (a synced Documents folder) are left to that computer
+    if entry["id"] in _active:
+        return False
+    pid = entry.get("pid")
+    if pid is None:
+        return True
+    if entry.get("host") != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        return True
+    return not _is_running(pid)
+
+
+def get_pending():
+    with _lock:
+        return [entry for entry in _load().values() if is_abandoned(entry)]
+
+
+def recover(on_published):
+    # Finishes publishes whose copy was complete and removes half written
+    # copies. on_published(entry) is called for every target that was renamed
+    resumed = 0
+    rolled_back = 0
+    for entry in get_pending():
+        state = entry.get("state")
+        if state == STAGED and os.path.isfile(entry["temp"]):
+            try:
+                os.replace(entry["temp"], entry["target"])
+                state = REPLACED
+            except OSError as e:
+                print(f"Could not finish publish of {entry['target']}: {e}")
+
+        if state == REPLACED:
+            try:
+                on_published(entry)
+                resumed += 1
+            except Exception as e:
+                print(f"Could not finish publish of {entry['target']}: {e}")
+            finish([entry["id"]])
+        else:
+            rollback(entry)
+            rolled_back += 1
+    return resumed, rolled_back
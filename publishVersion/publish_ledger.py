@@ -0,0 +1,165 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Every publish of a project is appended as one JSON line to this file, so
+# that "what is live" can be answered without reading attributes of each file
+ledger_file = ".ap/publish_ledger.jsonl"
+
+# Other computers append to the same file through the synced project folder,
+# a lock file next to the ledger keeps their writes apart
+LOCK_TIMEOUT = 10
+STALE_LOCK_SECONDS = 60
+# Bytes before the read offset that are compared to detect a rewritten file
+TAIL_SIZE = 256
+
+_lock = threading.Lock()
+
+# Parsed ledgers by path, only lines that were added since the last read are parsed
+_cache = {}
+
+
+def get_ledger_path(project_path):
+    return os.path.join(project_path, ledger_file)
+
+
+def to_project_path(project_path, path):
+    relative = os.path.relpath(path, project_path)
+    if relative.startswith(".."):
+        return path.replace("\\", "/")
+    return relative.replace("\\", "/")
+
+
+def append(project_path, records):
+    # records: dicts with source, target, version, hash and user
+    if not records:
+        return
+    now = time.time()
+    lines = []
+    for record in records:
+        record = dict(record)
+        record["source"] = to_project_path(project_path, record["source"])
+        record["target"] = to_project_path(project_path, record["target"])
+        record.setdefault("time", now)
+        lines.append(json.dumps(record) + "\n")
+
+    path = get_ledger_path(project_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock_file(path + ".lock"):
+        with open(path, "a", encoding="utf-8") as file:
+            file.write("".join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+
+
+@contextlib.contextmanager
+def _lock_file(lock_path):
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            # A lock of a crashed publish is removed after a while
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{lock_path} is locked by another publish")
+            time.sleep(0.1)
+    try:
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _is_unchanged(file, cached, stat):
+    # The file was only appended to if it is the same file and the bytes
+    # before the read offset are still the same
+    if cached is None or stat.st_ino != cached["inode"]:
+        return False
+    if stat.st_size < cached["offset"]:
+        return False
+    if stat.st_size == cached["offset"]:
+        return stat.st_mtime_ns == cached["mtime_ns"]
+    file.seek(cached["offset"] - len(cached["tail"]))
+    return file.read(len(cached["tail"])) == cached["tail"]
+
+
+def read(project_path):
+    path = get_ledger_path(project_path)
+    with _lock:
+        cached = _cache.get(path)
+        try:
+            file = open(path, "rb")
+        except OSError:
+            return []
+
+        with file:
+            stat = os.fstat(file.fileno())
+            if cached is not None and (
+                stat.st_size,
+                stat.st_mtime_ns,
+                stat.st_ino,
+            ) == (cached["offset"], cached["mtime_ns"], cached["inode"]):
+                return cached["records"]
+
+            if not _is_unchanged(file, cached, stat):
+                cached = {
+                    "offset": 0,
+                    "tail": b"",
+                    "inode": stat.st_ino,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "records": [],
+                    "latest": {},
+                }
+                _cache[path] = cached
+
+            file.seek(cached["offset"])
+            data = file.read(stat.st_size - cached["offset"])
+
+        # A line that is still being written is read the next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            cached["records"].append(record)
+            cached["latest"][record.get("target")] = record
+        cached["offset"] += end
+        cached["tail"] = (cached["tail"] + data[:end])[-TAIL_SIZE:]
+        if end == len(data):
+            cached["mtime_ns"] = stat.st_mtime_ns
+        return cached["records"]
+
+
+def get_latest(project_path):
+    # The last publish of every published file, by project relative target path
+    read(project_path)
+    with _lock:
+        cached = _cache.get(get_ledger_path(project_path))
+        return dict(cached["latest"]) if cached else {}
+
+
+def get_history(project_path, target):
+    target = to_project_path(project_path, target)
+    return [record for record in read(project_path) if record.get("target") == target]
+
+
+def get_published_by(project_path, user):
+    return [record for record in read(project_path) if record.get("user") == user]
+
+
+def get_previous(project_path, target):
+    # The publish that is live for target right now, or None
+    return get_latest(project_path).get(to_project_path(project_path, target))
@@ -16,6 +16,7 @@ settings = project.get_metadata()
 def store_settings_and_run(dialog):
     settings["publish_version_appendix"] = dialog.get_value("appendix_var")
     settings["checkbox"] = str(dialog.get_value("checkbox_var"))
+    settings["publish_verify"] = str(dialog.get_value("verify_var"))
     if dialog.get_value("checkbox_var") is True:
         settings["publish_file_location"] = dialog.get_value("location_var")
     else:
@@ -52,6 +53,12 @@ def create_dialog():
     except:
         pass
 
+    verify = "False"
+    try:
+        verify = settings["publish_verify"]
+    except:
+        pass
+
     dialog = ap.Dialog()
     dialog.title = "Create Referenced File"
     dialog.add_switch(
@@ -74,6 +81,14 @@ def create_dialog():
     dialog.add_info(
         "What should follow after the name without increment. E.g. <b>character_rig_v023.blend</b> <br>becomes <b>character_rig_published.blend</b>"
     )
+    dialog.add_switch(
+        text="Verify unchanged files",
+        var="verify_var",
+        default=(verify == "True"),
+    )
+    dialog.add_info(
+        "Compares the full content before a copy is skipped. Otherwise only <br>the size and sampled blocks are compared, which is much faster"
+    )
 
     if ctx.icon:
         dialog.icon = ctx.icon